@@ -0,0 +1,11 @@
+"""
+Micro-benchmarks for hot paths of the API.
+
+Run a benchmark as a module from the repository root, ex:
+`python -m benchmarks.carry_load`.
+When DATABASE_URL is not set the benchmarks use a scratch SQLite file.
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./benchmark.db")
+os.environ.setdefault("CHECK_BATTERY_INTERVAL", "3")
@@ -0,0 +1,88 @@
+"""
+Offline run of the battery simulation: many ticks over a synthetic fleet
+driven by a deterministic clock.
+"""
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+import benchmarks  # noqa: F401
+from sqlalchemy import func, insert, select
+
+from benchmarks.utils import count_round_trips, print_table, reset_database, timer
+from src.battery import BatterySimulation
+from src.clock import SimulatedClock
+from src.config.database import async_session_maker
+from src.models.drone import Drone, Models, Status
+from src.models.load import Load
+from src.services import update_and_check_battery
+
+FLEET_SIZES = [1_000, 5_000]
+TICKS = 20
+INTERVAL = timedelta(minutes=3)
+
+
+async def seed(fleet_size: int) -> None:
+    rng = random.Random(fleet_size)
+    await reset_database()
+    async with async_session_maker() as session:
+        drones = [
+            {
+                "serial_number": f"SIM{i}",
+                "model": rng.choice(list(Models)),
+                "state": rng.choice(list(Status)),
+                "weight_limit": 500,
+                "battery_capacity": rng.randint(0, 100),
+            }
+            for i in range(fleet_size)
+        ]
+        loads = [
+            {"drone_id": i, "weight_loaded": rng.randint(1, 500)}
+            for i in range(1, fleet_size + 1, 2)
+        ]
+        for start in range(0, fleet_size, 5_000):
+            await session.execute(insert(Drone).values(drones[start : start + 5_000]))
+        for start in range(0, len(loads), 5_000):
+            await session.execute(insert(Load).values(loads[start : start + 5_000]))
+        await session.commit()
+
+
+async def mean_battery() -> float:
+    async with async_session_maker() as session:
+        return await session.scalar(select(func.avg(Drone.battery_capacity)))
+
+
+async def main():
+    # keep the audit log out of the measure
+    logging.getLogger("battery_check").setLevel(logging.WARNING)
+    rows = []
+    for fleet_size in FLEET_SIZES:
+        await seed(fleet_size)
+        before = await mean_battery()
+        clock = SimulatedClock()
+        simulation = BatterySimulation(clock=clock, interval=3)
+        with count_round_trips() as round_trips, timer() as elapsed:
+            for _ in range(TICKS):
+                await update_and_check_battery(simulation=simulation)
+                clock.advance(INTERVAL)
+        rows.append(
+            [
+                fleet_size,
+                TICKS,
+                elapsed() / TICKS,
+                round_trips[0] / TICKS,
+                before,
+                await mean_battery(),
+            ]
+        )
+
+    print_table(
+        ["drones", "ticks", "ms/tick", "queries/tick", "mean before", "mean after"],
+        rows,
+        formatter=lambda c: f"{c:.2f}" if isinstance(c, float) else str(c),
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Registering a fleet of drones.
+
+Compares one `POST /drones/` per drone to a single `POST /drones/bulk/` with
+the same drones as a JSON array and as a CSV stream.
+"""
+import asyncio
+import json
+
+import benchmarks  # noqa: F401
+from httpx import AsyncClient
+
+from benchmarks.utils import count_round_trips, print_table, reset_database, timer
+from src.main import app
+
+SIZES = [100, 1_000, 5_000]
+# one by one takes long, the largest size is extrapolated from this one
+ONE_BY_ONE_MAX = 1_000
+
+
+def fleet(size: int, prefix: str) -> list[dict]:
+    return [
+        {
+            "serial_number": f"{prefix}-{i}",
+            "model": "MIDDLEWEIGHT",
+            "weight_limit": 300,
+            "battery_capacity": 100,
+            "state": "IDLE",
+        }
+        for i in range(size)
+    ]
+
+
+def to_csv(drones: list[dict]) -> bytes:
+    lines = [",".join(drones[0])]
+    lines += [",".join(str(value) for value in drone.values()) for drone in drones]
+    return "\n".join(lines).encode()
+
+
+async def one_by_one(client: AsyncClient, drones: list[dict]) -> None:
+    for drone in drones:
+        resp = await client.post("/drones/", json=drone)
+        assert resp.status_code == 200
+
+
+async def bulk_json(client: AsyncClient, drones: list[dict]) -> None:
+    resp = await client.post("/drones/bulk/", content=json.dumps(drones))
+    assert resp.json()["accepted"] == len(drones)
+
+
+async def bulk_csv(client: AsyncClient, drones: list[dict]) -> None:
+    resp = await client.post(
+        "/drones/bulk/", content=to_csv(drones), headers={"Content-Type": "text/csv"}
+    )
+    assert resp.json()["accepted"] == len(drones)
+
+
+async def measure(client: AsyncClient, register, drones: list[dict]) -> list:
+    await reset_database()
+    with count_round_trips() as trips, timer() as elapsed:
+        await register(client, drones)
+    return [elapsed(), trips[0]]
+
+
+async def main():
+    rows = []
+    async with AsyncClient(app=app, base_url="http://") as client:
+        for size in SIZES:
+            sample = min(size, ONE_BY_ONE_MAX)
+            ms, trips = await measure(client, one_by_one, fleet(sample, "ONE"))
+            row = [size, ms * size / sample, trips * size // sample]
+            row += await measure(client, bulk_json, fleet(size, "JSON"))
+            row += await measure(client, bulk_csv, fleet(size, "CSV"))
+            rows.append(row)
+
+    print_table(
+        [
+            "drones",
+            "one by one ms",
+            "queries",
+            "bulk JSON ms",
+            "queries",
+            "bulk CSV ms",
+            "queries",
+        ],
+        rows,
+        formatter=lambda c: f"{c:.1f}" if isinstance(c, float) else str(c),
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Round trips and latency of `drone_can_carry_load` against the order size.
+
+Compares the batched lookup with the former one query per medication id.
+"""
+import asyncio
+import random
+
+import benchmarks  # noqa: F401
+from sqlalchemy import insert
+
+from benchmarks.utils import count_round_trips, print_table, reset_database, timer
+from src.config.database import async_session_maker
+from src.dependencies import drone_can_carry_load
+from src.models.drone import Drone, Models, Status
+from src.models.medication import Medication
+from src.services import get_medication_by_id
+
+SIZES = [1, 10, 50, 100, 500, 1000]
+REPEAT = 5
+
+
+async def per_id_lookup(session, drone, medication_ids):
+    total_weight = 0
+    medications = []
+    for medication_id in medication_ids:
+        medication = await get_medication_by_id(session, medication_id)
+        if medication and total_weight + medication["weight"] <= drone.weight_limit:
+            total_weight += medication["weight"]
+            medications.append(medication)
+    return {"weight_loaded": total_weight, "medications": medications}
+
+
+async def measure(function, drone, medication_ids):
+    best = None
+    for _ in range(REPEAT):
+        async with async_session_maker() as session:
+            with count_round_trips() as round_trips, timer() as elapsed:
+                await function(session, drone, medication_ids)
+        best = min(best or elapsed(), elapsed())
+    return round_trips[0], best
+
+
+async def main():
+    await reset_database()
+    async with async_session_maker() as session:
+        await session.execute(
+            insert(Medication).values(
+                [
+                    {
+                        "name": f"med-{i}",
+                        "code": f"CODE_{i}",
+                        "weight": random.randint(1, 20),
+                    }
+                    for i in range(max(SIZES))
+                ]
+            )
+        )
+        drone = Drone(
+            serial_number="BENCH", model=Models.HEAVYWEIGHT, state=Status.IDLE
+        )
+        session.add(drone)
+        await session.commit()
+
+    rows = []
+    for size in SIZES:
+        medication_ids = random.sample(range(1, max(SIZES) + 1), size)
+        old_trips, old_ms = await measure(per_id_lookup, drone, medication_ids)
+        new_trips, new_ms = await measure(
+            lambda s, d, ids: drone_can_carry_load(d, ids, s), drone, medication_ids
+        )
+        rows.append([size, old_trips, old_ms, new_trips, new_ms])
+
+    print_table(
+        ["medications", "per-id trips", "per-id ms", "batched trips", "batched ms"],
+        rows,
+        formatter=lambda c: f"{c:.2f}" if isinstance(c, float) else str(c),
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Fan-out of the drone event hub to thousands of simulated subscribers.
+
+Every tick publishes a battery change for the whole fleet. Half of the
+subscribers follow every drone and half follow a handful of them. One
+subscriber in ten reads a tick late, so its changes get coalesced.
+"""
+import asyncio
+import random
+
+import benchmarks  # noqa: F401
+
+from benchmarks.utils import print_table, timer
+from src.events import DroneEventHub
+
+SUBSCRIBERS = [100, 1_000, 5_000]
+FLEET_SIZE = 1_000
+FILTERED_DRONES = 10
+TICKS = 10
+
+
+async def consume(subscription, slow: bool):
+    while True:
+        await subscription.next_batch()
+        if slow:
+            await asyncio.sleep(0.002)
+
+
+async def run(subscribers: int) -> list:
+    rng = random.Random(subscribers)
+    hub = DroneEventHub()
+    subscriptions = []
+    tasks = []
+    for i in range(subscribers):
+        drone_ids = None
+        if i % 2:
+            drone_ids = rng.sample(range(FLEET_SIZE), FILTERED_DRONES)
+        context = hub.subscribe(drone_ids)
+        subscription = context.__enter__()
+        subscriptions.append((context, subscription))
+        tasks.append(asyncio.create_task(consume(subscription, i % 10 == 0)))
+
+    publish_ms = 0.0
+    with timer() as elapsed:
+        for tick in range(TICKS):
+            changes = {i: {"battery_capacity": 100 - tick} for i in range(FLEET_SIZE)}
+            with timer() as publish:
+                await hub.publish(changes)
+            publish_ms += publish()
+            await asyncio.sleep(0)
+        # every tick changes every drone, so all the subscribers catch up
+        while any(s.seq < hub.seq for _, s in subscriptions):
+            await asyncio.sleep(0.001)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    delivered = sum(s.delivered for _, s in subscriptions)
+    coalesced = sum(s.coalesced for _, s in subscriptions)
+    for context, _ in subscriptions:
+        context.__exit__(None, None, None)
+    return [subscribers, publish_ms / TICKS, elapsed(), delivered, coalesced]
+
+
+async def main():
+    rows = [await run(subscribers) for subscribers in SUBSCRIBERS]
+    print_table(
+        ["subscribers", "publish ms/tick", "total ms", "delivered", "coalesced"],
+        rows,
+        formatter=lambda c: f"{c:.2f}" if isinstance(c, float) else str(c),
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,285 @@
+"""
+Throughput and latency of the HTTP API under concurrent clients.
+
+Seeds a fleet with `seed_db`, then replays the same requests on each
+scenario: the drone list, a drone, loading a drone and its loaded history.
+The app is driven in-process, or over uvicorn in a child process with
+`--server`. The report is JSON with the p50/p95/p99 latencies in ms and the
+requests per second of each scenario.
+
+Requests and data only depend on `--seed` and every round starts from a
+fresh seed, the figures reported are the median of the rounds. Two runs on
+the same machine are comparable: `--baseline` compares to a previous report
+and exits with 1 when a scenario got slower than `--tolerance` allows.
+
+    python -m benchmarks.load_test --output baseline.json
+    python -m benchmarks.load_test --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+
+import benchmarks  # noqa: F401
+from httpx import AsyncClient
+
+from src.config.database import DATABASE_URL
+from src.main import app
+from tests.utils import seed_db as fixtures
+from tests.utils.seed_db import seed_db
+
+# fixture rows of seed_db, the generated ones follow
+FIXTURE_DRONES = len(fixtures.drones)
+FIXTURE_MEDICATIONS = len(fixtures.medications)
+
+
+@dataclass
+class Request:
+    method: str
+    url: str
+    json: dict | None = None
+
+
+@dataclass
+class Result:
+    scenario: str
+    requests: int
+    errors: int
+    seconds: float
+    rps: float
+    p50: float
+    p95: float
+    p99: float
+    mean: float
+
+
+def scenarios(args: argparse.Namespace) -> dict[str, Callable[[], list[Request]]]:
+    """Scenario -> the requests it sends, the same for a given seed"""
+    rng = random.Random(args.seed)
+    drone_ids = range(1, FIXTURE_DRONES + args.drones + 1)
+    medication_ids = range(1, FIXTURE_MEDICATIONS + args.medications + 1)
+    # every generated drone is IDLE and can be loaded once
+    loadable = list(range(FIXTURE_DRONES + 1, FIXTURE_DRONES + args.drones + 1))
+    rng.shuffle(loadable)
+
+    def detail_url() -> str:
+        return f"/drones/{rng.choice(drone_ids)}"
+
+    def loading(drone_id: int) -> Request:
+        body = {
+            "origin": "Load test",
+            "destination": "Load test",
+            "create": "2023-01-01T00:00:00",
+            "medications": rng.sample(medication_ids, 3),
+        }
+        return Request("POST", f"/drones/{drone_id}/loading/", body)
+
+    return {
+        "list": lambda: [
+            Request("GET", f"/drones/?limit=100&cursor={rng.choice(drone_ids) - 1}")
+            for _ in range(args.requests)
+        ],
+        "detail": lambda: [Request("GET", detail_url()) for _ in range(args.requests)],
+        "loaded": lambda: [
+            Request("GET", f"{detail_url()}/loaded/") for _ in range(args.requests)
+        ],
+        "loading": lambda: [
+            loading(drone_id) for drone_id in loadable[: args.requests]
+        ],
+    }
+
+
+def percentile(latencies: list[float], percent: int) -> float:
+    if len(latencies) == 1:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1]
+
+
+async def run_scenario(
+    client: AsyncClient, name: str, requests: list[Request], concurrency: int
+) -> Result:
+    latencies: list[float] = []
+    errors = 0
+    pending = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for request in pending:
+            start = time.perf_counter()
+            resp = await client.request(request.method, request.url, json=request.json)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += resp.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    return Result(
+        scenario=name,
+        requests=len(latencies),
+        errors=errors,
+        seconds=round(seconds, 3),
+        rps=round(len(latencies) / seconds, 1),
+        p50=round(percentile(latencies, 50), 3),
+        p95=round(percentile(latencies, 95), 3),
+        p99=round(percentile(latencies, 99), 3),
+        mean=round(statistics.fmean(latencies), 3),
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(port: int) -> subprocess.Popen:
+    """uvicorn serving the app on the benchmark database"""
+    env = {**os.environ, "DATABASE_URL": DATABASE_URL, "LOG_LEVEL": "WARNING"}
+    command = [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port)]
+    server = subprocess.Popen(
+        command + ["--log-level", "warning"], env=env, stderr=subprocess.DEVNULL
+    )
+    async with AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        for _ in range(100):
+            try:
+                await client.get("/drones/1")
+                return server
+            except Exception:
+                await asyncio.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("uvicorn didn't start")
+
+
+def median_result(results: list[Result]) -> Result:
+    """Median of each figure over the rounds"""
+    figures = {
+        key: statistics.median(getattr(result, key) for result in results)
+        for key in ("requests", "errors", "seconds", "rps", "p50", "p95", "p99", "mean")
+    }
+    return Result(scenario=results[0].scenario, **figures)
+
+
+async def run_round(client: AsyncClient, args: argparse.Namespace) -> list[Result]:
+    results = []
+    for name, build in scenarios(args).items():
+        if args.scenario and name not in args.scenario:
+            continue
+        requests = build()
+        if requests and requests[0].method == "GET":
+            # warm the caches and the connections, not measured
+            await run_scenario(client, name, requests[: args.concurrency], 1)
+        results.append(await run_scenario(client, name, requests, args.concurrency))
+    return results
+
+
+async def load_test(args: argparse.Namespace) -> dict:
+    # the logs would be most of what is measured, the loading path warns for
+    # each medication left out
+    logging.disable(logging.WARNING)
+    rounds = []
+    for _ in range(args.rounds):
+        # loading changes the drones, each round starts from the same data
+        await seed_db(args.drones, args.medications, args.loads, seed=args.seed)
+        server = None
+        if args.server:
+            port = free_port()
+            server = await start_server(port)
+            client = AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60)
+        else:
+            client = AsyncClient(app=app, base_url="http://", timeout=60)
+        try:
+            async with client:
+                rounds.append(await run_round(client, args))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    return {
+        "target": "uvicorn" if args.server else "in-process",
+        "concurrency": args.concurrency,
+        "rounds": args.rounds,
+        "seed": args.seed,
+        "data": {
+            "drones": FIXTURE_DRONES + args.drones,
+            "medications": FIXTURE_MEDICATIONS + args.medications,
+            "loads": args.loads,
+        },
+        "python": platform.python_version(),
+        "database": DATABASE_URL.split(":", 1)[0],
+        "scenarios": [asdict(median_result(list(r))) for r in zip(*rounds)],
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `report` against `baseline`, empty when there is none"""
+    regressions = []
+    previous = {result["scenario"]: result for result in baseline["scenarios"]}
+    for result in report["scenarios"]:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+        for key in ("p50", "p95", "p99"):
+            if result[key] > before[key] * (1 + tolerance):
+                regressions.append(
+                    f"{result['scenario']} {key} {before[key]} -> {result[key]} ms"
+                )
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(
+                f"{result['scenario']} rps {before['rps']} -> {result['rps']}"
+            )
+        if result["errors"] > before["errors"]:
+            regressions.append(
+                f"{result['scenario']} errors {before['errors']} -> {result['errors']}"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test of the HTTP API")
+    parser.add_argument("--drones", type=int, default=2_000)
+    parser.add_argument("--medications", type=int, default=500)
+    parser.add_argument("--loads", type=int, default=5_000)
+    parser.add_argument("--requests", type=int, default=1_000, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3, help="median of the rounds")
+    parser.add_argument("--scenario", action="append", help="run only these")
+    parser.add_argument("--server", action="store_true", help="over uvicorn")
+    parser.add_argument("--output", help="write the report to this file")
+    parser.add_argument("--baseline", help="report to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = asyncio.run(load_test(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["target"] != report["target"] or baseline["data"] != report["data"]:
+            print("The baseline was run on another target or data", file=sys.stderr)
+            return 2
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Serialization of `/medications/` against the page size.
+
+Compares resolving the image URLs with the shared per request prefix to the
+former absolute path computed for every row, and times the whole request.
+"""
+import asyncio
+import os
+
+import benchmarks  # noqa: F401
+from httpx import AsyncClient
+from sqlalchemy import insert
+
+from benchmarks.utils import print_table, reset_database, timer
+from src.config.base_config import base_settings
+from src.config.database import async_session_maker
+from src.config.files import IMG_DIR
+from src.images import ImageUrls
+from src.main import app
+from src.models.medication import Medication
+from src.services import get_medications
+
+SIZES = [100, 1_000, 10_000]
+REPEAT = 5
+
+
+def per_row_paths(rows):
+    for row in rows:
+        if row.image:
+            os.path.abspath(os.path.join(IMG_DIR, row.image))
+
+
+def shared_prefix(rows):
+    urls = ImageUrls(IMG_DIR)
+    for row in rows:
+        urls.resolve(row.image, row.variants)
+
+
+def best_of(function, *args) -> float:
+    best = None
+    for _ in range(REPEAT):
+        with timer() as elapsed:
+            function(*args)
+        best = min(best or elapsed(), elapsed())
+    return best
+
+
+async def request_ms(client: AsyncClient, size: int) -> float:
+    best = None
+    for _ in range(REPEAT):
+        with timer() as elapsed:
+            resp = await client.get("/medications/", params={"limit": size})
+        assert len(resp.json()) == size
+        best = min(best or elapsed(), elapsed())
+    return best
+
+
+async def main():
+    await reset_database()
+    async with async_session_maker() as session:
+        await session.execute(
+            insert(Medication).values(
+                [
+                    {
+                        "name": f"med-{i}",
+                        "code": f"CODE_{i}",
+                        "weight": 10,
+                        "image": f"{i:064x}.jpeg",
+                        "variants": {"thumbnail": f"{i:064x}_thumbnail.webp"},
+                    }
+                    for i in range(max(SIZES))
+                ]
+            )
+        )
+        await session.commit()
+    base_settings.max_page_size = max(SIZES)
+
+    rows = []
+    async with AsyncClient(app=app, base_url="http://") as client:
+        for size in SIZES:
+            async with async_session_maker() as session:
+                medications = await get_medications(session, limit=size)
+            rows.append(
+                [
+                    size,
+                    best_of(per_row_paths, medications),
+                    best_of(shared_prefix, medications),
+                    await request_ms(client, size),
+                ]
+            )
+
+    print_table(
+        ["medications", "per-row path ms", "shared prefix ms", "request ms"],
+        rows,
+        formatter=lambda c: f"{c:.2f}" if isinstance(c, float) else str(c),
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Cost of the request and query metrics.
+
+The same requests are timed end to end with the metrics switched on and off
+through `registry.enabled`, in alternating rounds so that a drift of the
+machine weighs on both. The overhead of a route is the median over the rounds
+of the extra time with the metrics on. Exits with 1 when a route goes over
+MAX_OVERHEAD.
+"""
+import asyncio
+import logging
+import statistics
+import sys
+
+import benchmarks  # noqa: F401
+from httpx import AsyncClient
+
+from benchmarks.utils import count_round_trips, print_table, reset_database, timer
+from src.main import app
+from src.metrics import registry
+from tests.utils.seed_db import seed_db
+
+REQUESTS = 100
+ROUNDS = 21
+PATHS = ["/drones/1", "/drones/", "/drones/available/", "/medications/"]
+# budget to leave the metrics on in production
+MAX_OVERHEAD = 5
+
+
+async def request(client: AsyncClient, path: str) -> None:
+    resp = await client.get(path)
+    assert resp.status_code == 200
+
+
+async def request_us(client: AsyncClient, path: str, enabled: bool) -> float:
+    """Mean microseconds of a request with the metrics on or off"""
+    registry.enabled = enabled
+    with timer() as elapsed:
+        for _ in range(REQUESTS):
+            await request(client, path)
+    return elapsed() * 1000 / REQUESTS
+
+
+async def overhead(client: AsyncClient, path: str) -> tuple[float, float, float]:
+    """Median request time off and on, and median overhead in percent"""
+    # warm up the caches and the code paths of both modes
+    await request_us(client, path, True)
+    await request_us(client, path, False)
+    off, on, extra = [], [], []
+    for round_ in range(ROUNDS):
+        order = (False, True) if round_ % 2 else (True, False)
+        times = {enabled: await request_us(client, path, enabled) for enabled in order}
+        off.append(times[False])
+        on.append(times[True])
+        extra.append((times[True] - times[False]) / times[False] * 100)
+    return statistics.median(off), statistics.median(on), statistics.median(extra)
+
+
+async def main() -> int:
+    # the debug logs of the driver would hide the cost being measured
+    logging.disable(logging.INFO)
+    await reset_database()
+    await seed_db()
+    enabled = registry.enabled
+
+    rows = []
+    try:
+        async with AsyncClient(app=app, base_url="http://") as client:
+            for path in PATHS:
+                with count_round_trips() as statements:
+                    await request(client, path)
+                rows.append([path, statements[0], *await overhead(client, path)])
+    finally:
+        registry.enabled = enabled
+
+    print_table(
+        ["path", "statements", "off us", "on us", "overhead %"],
+        rows,
+        formatter=lambda c: f"{c:.2f}" if isinstance(c, float) else str(c),
+    )
+    worst = max(row[-1] for row in rows)
+    print(f"worst overhead {worst:.2f}%, budget {MAX_OVERHEAD}%")
+    if worst > MAX_OVERHEAD:
+        print("The metrics overhead is over budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
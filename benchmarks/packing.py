@@ -0,0 +1,47 @@
+"""
+Latency and utilisation of every packing strategy on large synthetic orders.
+"""
+import random
+
+from benchmarks.utils import print_table, timer
+from src.packing import PackingStrategy, pack, utilisation
+
+SIZES = [10, 100, 500, 1000, 5000]
+CAPACITY = 500
+REPEAT = 3
+
+
+def main():
+    rng = random.Random(42)
+    rows = []
+    for size in SIZES:
+        weights = [rng.randint(1, 250) for _ in range(size)]
+        values = [rng.randint(1, 10) for _ in range(size)]
+        for strategy in PackingStrategy:
+            best = None
+            for _ in range(REPEAT):
+                with timer() as elapsed:
+                    chosen = pack(strategy, weights, CAPACITY, values)
+                best = min(best or elapsed(), elapsed())
+            loaded = sum(weights[i] for i in chosen)
+            priority = sum(values[i] for i in chosen)
+            rows.append(
+                [
+                    size,
+                    strategy.value,
+                    best,
+                    len(chosen),
+                    utilisation(loaded, CAPACITY),
+                    priority,
+                ]
+            )
+
+    print_table(
+        ["medications", "strategy", "ms", "items", "utilisation", "priority"],
+        rows,
+        formatter=lambda c: f"{c:.3f}" if isinstance(c, float) else str(c),
+    )
+
+
+if __name__ == "__main__":
+    main()
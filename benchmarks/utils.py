@@ -0,0 +1,54 @@
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config.database import async_engine, custom_metadata
+
+
+async def reset_database(engine: AsyncEngine = async_engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(custom_metadata.drop_all)
+        await conn.run_sync(custom_metadata.create_all)
+
+
+@contextmanager
+def count_round_trips(engine: AsyncEngine = async_engine):
+    """Yield a one item list holding the statements executed while active."""
+    counter = [0]
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def timer():
+    """Yield a callable returning the elapsed milliseconds."""
+    start = time.perf_counter()
+    end = None
+
+    def elapsed() -> float:
+        return ((end or time.perf_counter()) - start) * 1000
+
+    try:
+        yield elapsed
+    finally:
+        end = time.perf_counter()
+
+
+def print_table(headers: list[str], rows: list[list], formatter: Callable = str):
+    widths = [
+        max(len(str(h)), *(len(formatter(r[i])) for r in rows))
+        for i, h in enumerate(headers)
+    ]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(formatter(c).rjust(w) for c, w in zip(row, widths)))
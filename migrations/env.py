@@ -23,6 +23,8 @@ if config.config_file_name is not None:
 from src.models.drone import Drone
 from src.models.medication import Medication
 from src.models.load import Load
+from src.models.image_blob import ImageBlob
+from src.models.table_version import TableVersion
 
 # target_metadata = mymodel.Base.metadata
 target_metadata = custom_metadata
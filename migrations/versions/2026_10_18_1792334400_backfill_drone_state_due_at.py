@@ -0,0 +1,43 @@
+"""backfill drone state_due_at
+
+Revision ID: 5c8a1f3e9b27
+Revises: d41c7a9e2f58
+Create Date: 2026-10-18 14:40:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5c8a1f3e9b27"
+down_revision = "d41c7a9e2f58"
+branch_labels = None
+depends_on = None
+
+# states moved on by the scheduler, see src.state_machine.SCHEDULE
+SCHEDULED_STATES = ("LOADED", "DELIVERING", "DELIVERED", "RETURNING")
+
+
+def upgrade() -> None:
+    # the drones created in a scheduled state had no due time and were never
+    # moved on, they are due now since how long they spent there is unknown
+    drone = sa.table(
+        "drone",
+        sa.column("state", sa.String),
+        sa.column("state_due_at", sa.DateTime),
+    )
+    op.execute(
+        drone.update()
+        .where(
+            drone.c.state.in_(SCHEDULED_STATES),
+            drone.c.state_due_at.is_(None),
+        )
+        .values(state_due_at=datetime.utcnow())
+    )
+
+
+def downgrade() -> None:
+    # the due times are kept, they are valid for the previous revision too
+    pass
@@ -0,0 +1,124 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from sqlalchemy import ColumnElement, Integer, case, cast, func, literal, or_, select
+from src.clock import Clock, SystemClock
+from src.config.base_config import base_settings
+from src.models.drone import Drone, Models, Status
+from src.models.load import Load
+
+
+def _by_value(mapping: Mapping, column, default: float) -> ColumnElement[float]:
+    if not mapping:
+        return literal(default)
+    return case(
+        *[(column == key, value) for key, value in mapping.items()], else_=default
+    )
+
+
+@dataclass(frozen=True)
+class BatteryModel:
+    """
+    Battery percent variation per minute
+    - drain by state, scaled by the drone's model factor
+    - recharge by state, independent of the model
+    - load_weight_factor is the extra drain per gram carried in the
+    `carrying` states, taken from the drone's last load
+    """
+
+    drain: Mapping[Status, float] = field(default_factory=dict)
+    recharge: Mapping[Status, float] = field(default_factory=dict)
+    model_factor: Mapping[Models, float] = field(default_factory=dict)
+    load_weight_factor: float = 0
+    carrying: frozenset[Status] = frozenset()
+
+    def battery_change(
+        self, minutes: float
+    ) -> tuple[ColumnElement[int], ColumnElement[float]]:
+        """
+        SQL expressions of the battery capacity and remainder after `minutes`
+        - the capacity moves by the whole percents reached, the fraction left
+        is carried to the next tick in battery_remainder so that rates below
+        1% per tick still add up
+        - the remainder is dropped once the capacity is capped at 0 or 100
+        """
+        drain = _by_value(self.drain, Drone.state, 0.0)
+        factor = _by_value(self.model_factor, Drone.model, 1.0)
+        recharge = _by_value(self.recharge, Drone.state, 0.0)
+        delta = drain * factor - recharge
+        if self.load_weight_factor and self.carrying:
+            last_load_weight = (
+                select(Load.weight_loaded)
+                .where(Load.drone_id == Drone.id)
+                .order_by(Load.create.desc(), Load.id.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+            delta = delta + case(
+                (
+                    Drone.state.in_(self.carrying),
+                    func.coalesce(last_load_weight, 0) * self.load_weight_factor,
+                ),
+                else_=0.0,
+            )
+        change = delta * minutes + Drone.battery_remainder
+        # truncated toward zero with round(), which every database has
+        whole = case(
+            (change >= 0, func.round(change - 0.5)),
+            else_=-func.round(-change - 0.5),
+        )
+        capacity = Drone.battery_capacity - cast(whole, Integer)
+        return (
+            case((capacity < 0, 0), (capacity > 100, 100), else_=capacity),
+            case((or_(capacity < 0, capacity > 100), 0.0), else_=change - whole),
+        )
+
+
+DEFAULT_BATTERY_MODEL = BatteryModel(
+    drain={
+        Status.LOADING: 0.1,
+        Status.LOADED: 0.1,
+        Status.DELIVERING: 1.0,
+        Status.DELIVERED: 0.2,
+        Status.RETURNING: 0.8,
+    },
+    recharge={Status.IDLE: 1.0},
+    model_factor={
+        Models.LIGHTWEIGHT: 0.8,
+        Models.MIDDLEWEIGHT: 1.0,
+        Models.CRUISERWEIGHT: 1.2,
+        Models.HEAVYWEIGHT: 1.5,
+    },
+    load_weight_factor=0.002,
+    carrying=frozenset({Status.LOADED, Status.DELIVERING}),
+)
+
+
+class BatterySimulation:
+    """
+    Evaluate a battery model on every tick of the battery job
+    - the elapsed time between ticks comes from the clock, the first tick
+    counts as `interval` minutes
+    """
+
+    def __init__(
+        self,
+        model: BatteryModel = DEFAULT_BATTERY_MODEL,
+        clock: Clock | None = None,
+        interval: float = base_settings.check_battery_interval,
+    ):
+        self.model = model
+        self.clock = clock or SystemClock()
+        self.interval = interval
+        self.last_tick = None
+
+    def elapsed_minutes(self) -> float:
+        now = self.clock.now()
+        if self.last_tick is None:
+            minutes = self.interval
+        else:
+            minutes = (now - self.last_tick).total_seconds() / 60
+        self.last_tick = now
+        return minutes
+
+
+battery_simulation = BatterySimulation()
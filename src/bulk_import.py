@@ -0,0 +1,208 @@
+import codecs
+import csv
+import json
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+from pydantic import BaseModel as Schema, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.cache import DRONES, MEDICATIONS, shared_cache
+from src.config.base_config import base_settings
+from src.models.base_model import BaseModel
+from src.models.drone import Drone
+from src.models.medication import Medication
+from src.schemas.drone import DroneCreate
+from src.schemas.medication import MedicationCreate
+from src.services import bump_table_versions
+from src.state_machine import state_machine
+
+
+@dataclass(frozen=True)
+class ImportTable:
+    model: type[BaseModel]
+    schema: type[Schema]
+    # unique column, a row repeating a value already taken is rejected
+    key: str
+    # namespace of the shared cache holding the table
+    namespace: str
+    # columns derived from the validated values
+    computed: Callable[[dict], dict] | None = None
+
+
+def _drone_columns(values: dict) -> dict:
+    return {"state_due_at": state_machine.due_at(values["state"])}
+
+
+DRONE_IMPORT = ImportTable(
+    Drone, DroneCreate, "serial_number", DRONES, computed=_drone_columns
+)
+MEDICATION_IMPORT = ImportTable(Medication, MedicationCreate, "code", MEDICATIONS)
+
+
+def json_rows(body: bytes) -> list:
+    rows = json.loads(body)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array")
+    return rows
+
+
+async def csv_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+    """
+    Parse a CSV stream as it arrives, the first line names the columns
+    - empty cells are left out so the defaults of the schema apply
+    - no importable value may hold a line break, the stream is split on them
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header = None
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for cells in csv.reader(lines):
+            if not cells:
+                continue
+            if header is None:
+                header = [name.strip() for name in cells]
+                continue
+            yield {name: cell for name, cell in zip(header, cells) if cell != ""}
+
+    pending += decoder.decode(b"", final=True)
+    for cells in csv.reader([pending]):
+        if cells and header is not None:
+            yield {name: cell for name, cell in zip(header, cells) if cell != ""}
+
+
+async def _aiter(rows: Iterable | AsyncIterable) -> AsyncIterator:
+    if isinstance(rows, AsyncIterable):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+def _errors(error: ValidationError) -> list[str]:
+    return [
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}"
+        for e in error.errors()
+    ]
+
+
+class BulkImport:
+    """
+    Validate and insert the rows of an import, a chunk at a time
+    - the values of the key column are checked against the import with a set
+    and against the table with one query per chunk
+    - each chunk is a multi-row INSERT committed on its own, an interrupted
+    import keeps the chunks done so far
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        table: ImportTable,
+        chunk_size: int | None = None,
+    ):
+        self.session = session
+        self.table = table
+        self.chunk_size = chunk_size or base_settings.import_chunk_size
+        self.key = getattr(table.model, table.key)
+        self.report: dict[str, Any] = {"accepted": 0, "rejected": 0, "rows": []}
+        # key value -> number of the row holding it
+        self._seen: dict[Any, int] = {}
+        # number of the row -> values to insert
+        self._chunk: dict[int, dict] = {}
+
+    async def run(self, rows: Iterable | AsyncIterable) -> dict:
+        try:
+            number = 0
+            async for row in _aiter(rows):
+                number += 1
+                values = self._validate(number, row)
+                if values is not None:
+                    self._chunk[number] = values
+                if len(self._chunk) >= self.chunk_size:
+                    await self._flush()
+            await self._flush()
+        finally:
+            if self.report["accepted"]:
+                await shared_cache.invalidate(self.table.namespace)
+        self.report["rows"].sort(key=lambda row: row["row"])
+        return self.report
+
+    def _validate(self, number: int, row: Any) -> dict | None:
+        if not isinstance(row, dict):
+            self._reject(number, "Expected an object")
+            return None
+        try:
+            values = self.table.schema.parse_obj(row).dict()
+        except ValidationError as e:
+            self._reject(number, *_errors(e))
+            return None
+        if self.table.computed is not None:
+            values.update(self.table.computed(values))
+        key = values[self.table.key]
+        if key in self._seen:
+            self._reject(
+                number, f"{self.table.key} repeats row {self._seen[key]} of the import"
+            )
+            return None
+        self._seen[key] = number
+        return values
+
+    async def _flush(self) -> None:
+        await self._reject_taken()
+        while self._chunk:
+            statement = (
+                insert(self.table.model)
+                .values(list(self._chunk.values()))
+                .returning(self.table.model.id, self.key)
+            )
+            try:
+                result = await self.session.execute(statement)
+                ids = {key: id for id, key in result.all()}
+                await self.session.commit()
+            except IntegrityError:
+                await self.session.rollback()
+                # a concurrent write took some of the keys
+                if not await self._reject_taken():
+                    raise
+                continue
+            await bump_table_versions(self.session, self.table.model.__tablename__)
+            for number, values in self._chunk.items():
+                self._accept(number, ids[values[self.table.key]])
+            self._chunk.clear()
+
+    async def _reject_taken(self) -> int:
+        if not self._chunk:
+            return 0
+        keys = [values[self.table.key] for values in self._chunk.values()]
+        query = select(self.key).where(self.key.in_(keys))
+        taken = set((await self.session.execute(query)).scalars().all())
+        for number, values in list(self._chunk.items()):
+            if values[self.table.key] in taken:
+                del self._chunk[number]
+                self._reject(number, f"{self.table.key} already registered")
+        return len(taken)
+
+    def _accept(self, number: int, id: int) -> None:
+        self.report["accepted"] += 1
+        self.report["rows"].append({"row": number, "status": "accepted", "id": id})
+
+    def _reject(self, number: int, *errors: str) -> None:
+        self.report["rejected"] += 1
+        self.report["rows"].append(
+            {"row": number, "status": "rejected", "errors": list(errors)}
+        )
+
+
+async def bulk_import(
+    session: AsyncSession,
+    table: ImportTable,
+    rows: Iterable | AsyncIterable,
+    chunk_size: int | None = None,
+) -> dict:
+    """Import `rows` into `table`, returns the ImportReport of every row"""
+    return await BulkImport(session, table, chunk_size).run(rows)
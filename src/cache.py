@@ -0,0 +1,278 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Any
+from uuid import uuid4
+from src.cache_backends import CacheBackend, get_backend
+from src.config.base_config import base_settings
+from src.config.logs import get_logger
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class AsyncLRUCache:
+    """
+    Size bounded read-through cache with a time to live
+    - the least recently used entry is evicted once `maxsize` is reached
+    - concurrent misses on a key share a single load
+    - None is never cached, a missing row is looked up again next time
+    - a load that was running when something got invalidated isn't stored,
+    it may have read the row before the change
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            return value
+        if key in self._loading:
+            return await asyncio.shield(self._loading[key])
+
+        [future] = self._start([key])
+        generation = self._generation
+        try:
+            value = await loader()
+        except BaseException as e:
+            self._fail({key: future}, e)
+            raise
+        self._finish(key, future, generation, value)
+        return value
+
+    async def get_many(
+        self,
+        keys: Iterable[Hashable],
+        loader: Callable[[list], Awaitable[dict]],
+    ) -> dict:
+        """
+        Look up many keys, the missing ones are loaded with a single call
+        - `loader` gets the missing keys and returns key -> value
+        """
+        result = {}
+        waiting = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            found, value = self._lookup(key)
+            if found:
+                result[key] = value
+            elif key in self._loading:
+                waiting[key] = self._loading[key]
+            else:
+                missing.append(key)
+
+        if missing:
+            futures = dict(zip(missing, self._start(missing)))
+            generation = self._generation
+            try:
+                loaded = await loader(missing)
+            except BaseException as e:
+                self._fail(futures, e)
+                raise
+            for key, future in futures.items():
+                value = loaded.get(key)
+                self._finish(key, future, generation, value)
+                if value is not None:
+                    result[key] = value
+
+        for key, future in waiting.items():
+            value = await asyncio.shield(future)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+            self._loading.pop(key, None)
+        self._generation += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._loading.clear()
+        self._generation += 1
+
+    def _lookup(self, key: Hashable) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self.clock():
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return True, value
+            del self._entries[key]
+        self.stats.misses += 1
+        return False, None
+
+    def _start(self, keys: list[Hashable]) -> list[asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in keys]
+        self._loading.update(zip(keys, futures))
+        return futures
+
+    def _finish(
+        self, key: Hashable, future: asyncio.Future, generation: int, value: Any
+    ) -> None:
+        if self._loading.get(key) is future:
+            del self._loading[key]
+        future.set_result(value)
+        if value is not None and generation == self._generation:
+            self._store(key, value)
+
+    def _fail(self, futures: dict[Hashable, asyncio.Future], error: BaseException):
+        for key, future in futures.items():
+            if self._loading.get(key) is future:
+                del self._loading[key]
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+                continue
+            future.set_exception(error)
+            # the waiters get the error, don't warn when there are none
+            future.exception()
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+
+class SharedCache:
+    """
+    JSON values shared by every worker through a CacheBackend
+    - keys live in versioned namespaces, invalidating a namespace bumps its
+    version so the entries written before are never read again and expire
+    - invalidations are published, the other workers forget their copy of
+    the version and clear the in-process caches registered for the namespace
+    - the database is read directly while the backend is unreachable
+    """
+
+    channel = "cache-invalidation"
+
+    def __init__(self, backend: CacheBackend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self._id = uuid4().hex
+        self._versions: dict[str, int] = {}
+        self._listeners: dict[str, list[Callable[[], None]]] = {}
+        self._task: asyncio.Task | None = None
+
+    def on_invalidate(self, namespace: str, callback: Callable[[], None]) -> None:
+        """Run `callback` when another worker invalidates `namespace`"""
+        self._listeners.setdefault(namespace, []).append(callback)
+
+    async def get_or_load(
+        self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        try:
+            name = f"{namespace}:{await self._version(namespace)}:{key}"
+            cached = await self.backend.get(name)
+        except Exception:
+            get_logger().exception("The cache backend is unreachable")
+            return await loader()
+        if cached is not None:
+            return json.loads(cached)
+
+        value = await loader()
+        try:
+            await self.backend.set(name, json.dumps(value).encode(), self.ttl)
+        except Exception:
+            get_logger().exception("The cache backend is unreachable")
+        return value
+
+    async def invalidate(self, *namespaces: str) -> None:
+        """To be called once the write is committed"""
+        message = {"sender": self._id, "namespaces": namespaces}
+        try:
+            for namespace in namespaces:
+                version = await self.backend.incr(f"{namespace}:version")
+                self._versions[namespace] = version
+            await self.backend.publish(self.channel, json.dumps(message).encode())
+        except Exception:
+            get_logger().exception("The cache backend is unreachable")
+
+    async def start(self) -> None:
+        """Listen to the invalidations of the other workers"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.backend.close()
+
+    async def _version(self, namespace: str) -> int:
+        if namespace not in self._versions:
+            version = int(await self.backend.get(f"{namespace}:version") or 0)
+            # an invalidation may have set a newer version meanwhile
+            self._versions.setdefault(namespace, version)
+        return self._versions[namespace]
+
+    async def _listen(self) -> None:
+        while True:
+            # the messages sent while disconnected are lost
+            self._versions.clear()
+            try:
+                async for message in self.backend.subscribe(self.channel):
+                    self._receive(json.loads(message))
+            except Exception:
+                get_logger().exception("Lost the cache invalidation channel")
+            await asyncio.sleep(1)
+
+    def _receive(self, message: dict) -> None:
+        if message["sender"] == self._id:
+            return
+        for namespace in message["namespaces"]:
+            self._versions.pop(namespace, None)
+            for callback in self._listeners.get(namespace, ()):
+                callback()
+
+
+# column values of the medications, not the instances which belong to the
+# session that loaded them, shared between requests so they must be read only
+medications_by_id = AsyncLRUCache(
+    base_settings.medication_cache_size, base_settings.medication_cache_ttl
+)
+medications_by_code = AsyncLRUCache(
+    base_settings.medication_cache_size, base_settings.medication_cache_ttl
+)
+
+# namespaces of the shared cache
+DRONES = "drones"
+MEDICATIONS = "medications"
+
+shared_cache = SharedCache(
+    get_backend(base_settings.cache_url, base_settings.cache_max_entries),
+    base_settings.cache_ttl,
+)
+shared_cache.on_invalidate(MEDICATIONS, medications_by_id.clear)
+shared_cache.on_invalidate(MEDICATIONS, medications_by_code.clear)
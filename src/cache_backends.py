@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable
+from typing import Protocol
+import redis.asyncio as redis
+
+
+class CacheBackend(Protocol):
+    """Key-value store shared by the workers, with a pub/sub channel"""
+
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        ...
+
+    async def incr(self, key: str) -> int:
+        ...
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        ...
+
+    def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+class MemoryBackend:
+    """
+    Backend for a single worker, nothing leaves the process
+    - the least recently used value is evicted once `maxsize` is reached,
+    the keys of a stale namespace version are never read again
+    - the counters never expire nor are evicted, a namespace version
+    starting over would serve the entries written under it before
+    """
+
+    def __init__(
+        self, maxsize: int = 10_000, clock: Callable[[], float] = time.monotonic
+    ):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._values: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._counters: dict[str, int] = {}
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    async def get(self, key: str) -> bytes | None:
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._values[key]
+            return None
+        self._values.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        self._values[key] = (self.clock() + ttl, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue[bytes] = asyncio.Queue()
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].discard(queue)
+
+    async def close(self) -> None:
+        self._values.clear()
+        self._counters.clear()
+
+
+class RedisBackend:
+    """Backend on a Redis compatible server, shared by every worker"""
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        await self.client.set(key, value, ex=ttl)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.close()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def get_backend(url: str, maxsize: int = 10_000) -> CacheBackend:
+    """`memory://` or a `redis://` URL, `maxsize` bounds the memory backend"""
+    if url.startswith("memory://"):
+        return MemoryBackend(maxsize)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache backend {url}")
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from typing import Protocol
+
+
+class Clock(Protocol):
+    def now(self) -> datetime:
+        ...
+
+
+class SystemClock:
+    """Wall clock in UTC, naive like the datetimes stored by the models"""
+
+    def now(self) -> datetime:
+        return datetime.utcnow()
+
+
+class SimulatedClock:
+    """Deterministic clock that only moves when it's advanced"""
+
+    def __init__(self, start: datetime = datetime(2023, 1, 1)):
+        self._now = start
+
+    def now(self) -> datetime:
+        return self._now
+
+    def advance(self, delta: timedelta) -> datetime:
+        self._now += delta
+        return self._now
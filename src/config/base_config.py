@@ -1,9 +1,69 @@
+from typing import Literal
 from pydantic import BaseSettings
 
 
 class BaseConfig(BaseSettings):
     check_battery_interval: int
     database_url: str
+    # connection pool of the database engine
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # seconds a request waits for a free connection before failing
+    db_pool_timeout: float = 30
+    # seconds before a connection is replaced, -1 keeps them, and whether
+    # it's tested before use, neither applies to SQLite
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # seconds a statement may run before the server cancels it, PostgreSQL
+    db_statement_timeout: float | None = None
+    # run on every SQLite connection, in WAL mode readers don't block writers
+    sqlite_pragmas: dict[str, str] = {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": "5000",
+    }
+    battery_batch_size: int = 1000
+    # seconds between the checks of due state transitions
+    state_check_interval: int = 10
+    # seconds a drone stays in each state before moving on
+    loaded_duration: int = 60
+    delivering_duration: int = 600
+    delivered_duration: int = 60
+    returning_duration: int = 600
+    page_size: int = 100
+    max_image_size: int = 5 * 1024 * 1024
+    # URL prefix of the images, a CDN for example, defaults to the static mount
+    image_base_url: str | None = None
+    # processes generating the image variants
+    image_workers: int = 2
+    max_page_size: int = 1000
+    # medications kept in memory, and for how many seconds
+    medication_cache_size: int = 10_000
+    medication_cache_ttl: int = 300
+    # cache shared by the workers, memory:// or a redis:// URL
+    cache_url: str = "memory://"
+    cache_ttl: int = 60
+    # values kept by the memory:// cache, the least recently used go first
+    cache_max_entries: int = 10_000
+    # logs written by a background thread, as text or JSON lines, rotated
+    # once a file reaches log_max_bytes or every midnight
+    log_level: str = "DEBUG"
+    log_format: Literal["text", "json"] = "text"
+    log_rotation: Literal["size", "time"] = "size"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    # records waiting to be written, the ones logged when it's full are lost
+    log_queue_size: int = 10_000
+    # warnings of the loading path kept per second and kind of message
+    log_rate_limit: int = 10
+    # request and query timings served at /metrics
+    metrics_enabled: bool = True
+    # rows of a bulk import validated and inserted together
+    import_chunk_size: int = 500
+    # rows of a generated table inserted together
+    seed_chunk_size: int = 1000
+    # sent in the X-Admin-Token header of the admin routes, unset disables them
+    admin_token: str | None = None
 
     @property
     def battery_interval(self) -> int:
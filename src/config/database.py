@@ -1,13 +1,56 @@
 from collections.abc import AsyncGenerator
 
-from sqlalchemy import MetaData
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from .base_config import base_settings
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from .base_config import BaseConfig, base_settings
+from .pool import MeteredPool
 
 
 DATABASE_URL = base_settings.database_url
 
-async_engine = create_async_engine(DATABASE_URL)
+
+def engine_options(url: str, settings: BaseConfig = base_settings) -> dict:
+    """Keyword arguments of create_async_engine for `url`"""
+    url = make_url(url)
+    options = {
+        "poolclass": MeteredPool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+    }
+    if url.get_backend_name() == "sqlite":
+        # an in-memory database lives in its single connection
+        return {} if url.database in (None, "", ":memory:") else options
+
+    options["pool_recycle"] = settings.db_pool_recycle
+    options["pool_pre_ping"] = settings.db_pool_pre_ping
+    if settings.db_statement_timeout and url.get_driver_name() == "asyncpg":
+        timeout = str(int(settings.db_statement_timeout * 1000))
+        options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+    return options
+
+
+def create_engine(url: str, settings: BaseConfig = base_settings) -> AsyncEngine:
+    engine = create_async_engine(url, **engine_options(url, settings))
+    if engine.dialect.name == "sqlite" and settings.sqlite_pragmas:
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in settings.sqlite_pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return engine
+
+
+async_engine = create_engine(DATABASE_URL)
 
 convention = {
     "ix": "%(column_0_label)s_idx",
@@ -22,5 +65,9 @@ async_session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session of the request, FastAPI caches the dependency so the endpoint
+    and all of its dependencies share it
+    """
     async with async_session_maker() as session:
         yield session
@@ -1,6 +1,14 @@
+import atexit
+import json
 import logging
+import queue
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 import os
+from .base_config import base_settings
 from .files import BASEDIR
 
 if not os.path.isdir(os.path.join(BASEDIR, "src/logs/")):
@@ -8,46 +16,143 @@ if not os.path.isdir(os.path.join(BASEDIR, "src/logs/")):
 
 LOG_DIR = os.path.join(BASEDIR, "src/logs/")
 
+# attributes every record has, the others were passed with `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the `extra` fields of the record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Keep at most `rate` records per second of each message template, with
+    bursts up to `burst`
+    - the next record let through tells how many similar ones were dropped
+    """
+
+    def __init__(
+        self,
+        rate: float = 10,
+        burst: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self.clock = clock
+        self.suppressed = 0
+        # template -> tokens, last refill, records dropped since the last one
+        self._buckets: dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = self.clock()
+        key = (record.name, record.levelno, record.msg)
+        bucket = self._buckets.setdefault(key, [self.burst, now, 0])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.msg = f"{record.msg} ({bucket[2]} similar messages suppressed)"
+            bucket[2] = 0
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Hand the records to a QueueListener, never block when it lags"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def file_handler(filename: str) -> dict:
+    """Config of a rotated log file"""
+    path = os.path.join(LOG_DIR, filename)
+    if base_settings.log_rotation == "time":
+        return {
+            "class": "logging.handlers.TimedRotatingFileHandler",
+            "filename": path,
+            "when": "midnight",
+            "backupCount": base_settings.log_backup_count,
+        }
+    return {
+        "class": "logging.handlers.RotatingFileHandler",
+        "filename": path,
+        "maxBytes": base_settings.log_max_bytes,
+        "backupCount": base_settings.log_backup_count,
+    }
+
+
+log_format = "json" if base_settings.log_format == "json" else "standard"
+
 log_config = {
     "version": 1,
     "disable_existing_loggers": False,
     "loggers": {
         "root": {
-            "level": logging.DEBUG,
+            "level": base_settings.log_level,
             "handlers": ["console", "file"],
-            "formatter": "standard",
             "propagate": 0,
         },
+        # per medication warnings, an order may log one for each of them
+        "loading": {"filters": ["rate_limit"]},
         "battery_check": {
             "handlers": ["audit"],
-            "formatter": "standard",
             "propagate": 0,
         },
-        "uvicorn": {"handlers": ["console"], "formatter": "standard", "propagate": 0},
+        "uvicorn": {"handlers": ["console"], "propagate": 0},
     },
     "formatters": {
         "standard": {
             "format": "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
         },
+        "json": {"()": JsonFormatter},
+    },
+    "filters": {
+        "rate_limit": {"()": RateLimitFilter, "rate": base_settings.log_rate_limit},
     },
     "handlers": {
         "console": {
             "level": "DEBUG",
-            "formatter": "standard",
+            "formatter": log_format,
             "class": "logging.StreamHandler",
             "stream": "ext://sys.stderr",
         },
         "file": {
             "level": "DEBUG",
-            "class": "logging.FileHandler",
-            "formatter": "standard",
-            "filename": os.path.join(LOG_DIR, "drone.log"),
+            "formatter": log_format,
+            **file_handler("drone.log"),
         },
+        # behind a queue without a size limit, nothing is lost
         "audit": {
             "level": "INFO",
-            "class": "logging.FileHandler",
-            "formatter": "standard",
-            "filename": os.path.join(LOG_DIR, "battery.log"),
+            "formatter": log_format,
+            **file_handler("battery.log"),
         },
     },
 }
@@ -55,5 +160,61 @@ log_config = {
 dictConfig(log_config)
 
 
+def start_log_queue(
+    logger: logging.Logger, maxsize: int = base_settings.log_queue_size
+) -> QueueListener:
+    """
+    Move the handlers of `logger` behind a queue of `maxsize` records, a
+    background thread does the formatting and the writes
+    - 0 doesn't limit the queue, no record is ever dropped
+    """
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    listener = QueueListener(
+        queue.Queue(maxsize),
+        *handlers,
+        respect_handler_level=True,
+    )
+    logger.addHandler(DroppingQueueHandler(listener.queue))
+    listener.start()
+    return listener
+
+
+log_listeners = [
+    start_log_queue(logging.getLogger()),
+    start_log_queue(logging.getLogger("uvicorn")),
+    # the audit of the battery checks is lossless
+    start_log_queue(logging.getLogger("battery_check"), maxsize=0),
+]
+# write what is still queued when the process exits
+for listener in log_listeners:
+    atexit.register(listener.stop)
+
+
+def flush_logs() -> None:
+    """Block until every queued record has been written"""
+    for listener in log_listeners:
+        listener.queue.join()
+
+
+def log_stats() -> dict[str, int]:
+    """Records lost to a full queue and dropped by the rate limits"""
+    loggers = [logging.getLogger(), logging.getLogger("uvicorn")]
+    return {
+        "dropped": sum(
+            handler.dropped
+            for logger in loggers
+            for handler in logger.handlers
+            if isinstance(handler, DroppingQueueHandler)
+        ),
+        "suppressed": sum(
+            log_filter.suppressed
+            for log_filter in logging.getLogger("loading").filters
+            if isinstance(log_filter, RateLimitFilter)
+        ),
+    }
+
+
 def get_logger(name: str = "root"):
     return logging.getLogger(name)
@@ -0,0 +1,44 @@
+import time
+from dataclasses import asdict, dataclass
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass
+class PoolMetrics:
+    checkouts: int = 0
+    # checkouts given up after pool_timeout, the pool was exhausted
+    timeouts: int = 0
+    # requests waiting for a connection right now
+    waiting: int = 0
+    wait_seconds: float = 0
+    max_wait_seconds: float = 0
+
+    def snapshot(self) -> dict:
+        return asdict(self)
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    """Queue pool timing how long each checkout waits for a connection"""
+
+    metrics = pool_metrics
+
+    def _do_get(self):
+        metrics = self.metrics
+        metrics.waiting += 1
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except TimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.waiting -= 1
+            waited = time.perf_counter() - start
+            metrics.wait_seconds += waited
+            metrics.max_wait_seconds = max(metrics.max_wait_seconds, waited)
+        metrics.checkouts += 1
+        return connection
@@ -1,5 +1,15 @@
-from collections.abc import Mapping
-from fastapi import HTTPException, status, Depends
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Mapping
+import secrets
+from fastapi import (
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.schemas.drone import Drone
 from src.config.database import get_async_session
@@ -7,10 +17,72 @@ from .services import (
     get_available_drones,
     get_drone_by_id,
     get_medication_by_id,
+    get_medications_by_ids,
     get_drone_loads,
+    get_table_versions,
 )
-from src.models.drone import Status
+from src.models.drone import Models, Status
+from src.config.base_config import base_settings
+from src.packing import PackingStrategy, first_fit_decreasing, pack
 from src.config.logs import get_logger
+from src.config.files import IMG_DIR
+from src.bulk_import import csv_rows, json_rows
+from src.images import (
+    ImageTooLarge,
+    ImageUrls,
+    InvalidImage,
+    StagedImage,
+    stage_upload,
+)
+
+
+def page_params(
+    cursor: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=base_settings.page_size, gt=0),
+) -> dict[str, int | None]:
+    """Keyset pagination on id, the page size is capped by max_page_size"""
+    return {"after": cursor, "limit": min(limit, base_settings.max_page_size)}
+
+
+def table_etag(*tables: str) -> Callable:
+    """
+    Dependency tagging the response with the write counters of `tables`,
+    answers 304 without reading the rows when the client's copy is current
+    - returns the ETag, cached responses are keyed by it so they are never
+    older than the tag sent with them
+    """
+
+    async def check_etag(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(get_async_session),
+    ) -> str:
+        versions = await get_table_versions(session, tables)
+        etag = '"' + "-".join(f"{t}.{versions.get(t, 0)}" for t in tables) + '"'
+        if_none_match = request.headers.get("if-none-match", "")
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            raise HTTPException(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        response.headers["ETag"] = etag
+        return etag
+
+    return check_etag
+
+
+def drone_filters(
+    state: Status | None = None,
+    model: Models | None = None,
+    battery_min: int | None = Query(default=None, ge=0, le=100),
+    battery_max: int | None = Query(default=None, ge=0, le=100),
+) -> dict:
+    return {
+        "state": state,
+        "model": model,
+        "battery_min": battery_min,
+        "battery_max": battery_max,
+    }
 
 
 async def valid_drone_id(
@@ -72,28 +144,146 @@ async def valid_medication_id(
     return result
 
 
+async def import_rows(request: Request) -> list | AsyncIterator[dict]:
+    """Rows of a bulk import, a JSON array or a CSV stream with a header"""
+    content_type = request.headers.get("content-type", "application/json")
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type == "text/csv":
+        return csv_rows(request.stream())
+    if media_type != "application/json":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send a JSON array or a text/csv stream",
+        )
+    try:
+        return json_rows(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def admin_access(x_admin_token: str | None = Header(default=None)) -> None:
+    """The admin routes don't exist until ADMIN_TOKEN is set"""
+    if base_settings.admin_token is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token, base_settings.admin_token
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token"
+        )
+
+
+def image_urls() -> ImageUrls:
+    return ImageUrls(base_settings.image_base_url or IMG_DIR)
+
+
+async def valid_image(
+    image: UploadFile | None = None,
+) -> AsyncGenerator[StagedImage | None, None]:
+    """Stage the uploaded image, the temporary file is removed after the
+    request unless it was published"""
+    if not image:
+        yield None
+        return
+    try:
+        staged = await stage_upload(image, base_settings.max_image_size)
+    except InvalidImage as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
+    except ImageTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
+    try:
+        yield staged
+    finally:
+        await staged.discard()
+
+
 async def drone_can_carry_load(
     drone: Drone,
     medications: list[int],
     session: AsyncSession = Depends(get_async_session),
+    strategy: PackingStrategy = PackingStrategy.FIRST_FIT,
+    priorities: Mapping[int, int] | None = None,
 ) -> list[int] | None:
-    logger = get_logger()
-    medications_can_carry = []
-    total_weight = 0
+    logger = get_logger("loading")
+    medications_by_id = await get_medications_by_ids(session, medications)
+    candidates = []
     for medication_id in medications:
+        medication = medications_by_id.get(medication_id)
         # skip incorrect medication ids
-        try:
-            medication = await valid_medication_id(medication_id, session)
-        except HTTPException as e:
-            logger.exception(e)
+        if medication is None:
+            logger.error("Don't exist any Medication with id %s", medication_id)
+            continue
+        candidates.append(medication)
+
+    priorities = priorities or {}
+    chosen = set(
+        pack(
+            strategy,
+            [medication["weight"] for medication in candidates],
+            drone.weight_limit,
+            [priorities.get(medication["id"], 1) for medication in candidates],
+        )
+    )
+    medications_can_carry = []
+    total_weight = 0
+    for index, medication in enumerate(candidates):
+        if index in chosen:
+            total_weight += medication["weight"]
+            medications_can_carry.append(medication)
         else:
-            total_weight += medication.weight
-            if total_weight <= drone.weight_limit:
-                medications_can_carry.append(medication)
-            else:
-                # in case another medication can be loaded
-                total_weight -= medication.weight
-                logger.warning(
-                    f"{medication.name} medication can't be load in drone {drone.serial_number} because its weight exceeds the drone's weight limit"
-                )
-    return {"weight_loaded": total_weight, "medications": medications_can_carry}
+            logger.warning(
+                "%s medication can't be load in drone %s because its weight exceeds the drone's weight limit",
+                medication["name"],
+                drone.serial_number,
+            )
+    return {
+        "weight_loaded": total_weight,
+        "medications": medications_can_carry,
+        "strategy": strategy,
+    }
+
+
+async def drones_can_carry_order(
+    drones: list[Drone],
+    medications: list[int],
+    session: AsyncSession = Depends(get_async_session),
+) -> dict[str, list]:
+    """
+    Split an order across the drones with first fit decreasing, the drones
+    with the highest weight limit are filled first
+    """
+    logger = get_logger("loading")
+    medications_by_id = await get_medications_by_ids(session, medications)
+    candidates = []
+    unassigned = []
+    for medication_id in medications:
+        medication = medications_by_id.get(medication_id)
+        if medication is None:
+            logger.error("Don't exist any Medication with id %s", medication_id)
+            unassigned.append(medication_id)
+            continue
+        candidates.append(medication)
+
+    drones = sorted(drones, key=lambda drone: drone.weight_limit, reverse=True)
+    bins = first_fit_decreasing(
+        [medication["weight"] for medication in candidates],
+        [drone.weight_limit for drone in drones],
+        [medication["id"] for medication in candidates],
+    )
+    assigned = {index for items in bins for index in items}
+    for index, medication in enumerate(candidates):
+        if index not in assigned:
+            logger.warning(
+                "%s medication can't be load in any available drone",
+                medication["name"],
+            )
+            unassigned.append(medication["id"])
+
+    assignments = [
+        (drone, [candidates[index] for index in items])
+        for drone, items in zip(drones, bins)
+        if items
+    ]
+    return {"assignments": assignments, "unassigned": unassigned}
@@ -0,0 +1,195 @@
+import asyncio
+import enum
+import json
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable, Iterator, Mapping
+from contextlib import contextmanager, suppress
+from uuid import uuid4
+from src.cache import shared_cache
+from src.cache_backends import CacheBackend
+from src.config.logs import get_logger
+
+# drone fields sent to the subscribers
+EVENT_FIELDS = ("state", "battery_capacity")
+
+
+class Subscription:
+    """
+    Cursor of one subscriber on the changes of the hub
+    - a batch holds the latest state of each drone changed since the previous
+    batch, a slow client skips the intermediate values
+    - `drone_ids` None means every drone
+    """
+
+    def __init__(self, hub: "DroneEventHub", drone_ids: set[int] | None = None):
+        self.hub = hub
+        self.drone_ids = drone_ids
+        self.seq = hub.seq
+        self.delivered = 0
+        # publications merged into a later batch
+        self.coalesced = 0
+        self._wakeups = 0
+        self._ready = asyncio.Event()
+
+    def wake(self) -> None:
+        self._wakeups += 1
+        self._ready.set()
+
+    async def next_batch(self) -> list[dict]:
+        """Wait for changes and take every pending one"""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            self.coalesced += self._wakeups - 1
+            self._wakeups = 0
+            batch = self.hub.changes_since(self.seq, self.drone_ids)
+            self.seq = self.hub.seq
+            if batch:
+                self.delivered += len(batch)
+                return batch
+
+
+class DroneEventHub:
+    """
+    Fan out the drone changes to the subscribers of this worker
+    - the latest state of every drone is kept once, publishing only wakes
+    the subscribers up and each one reads what changed since its last batch
+    - the subscriptions to some drones are indexed by drone, a change only
+    wakes the ones interested in it
+    - with a backend the changes are relayed to the hubs of the other workers
+    """
+
+    channel = "drone-events"
+
+    def __init__(self, backend: CacheBackend | None = None):
+        self.backend = backend
+        self.seq = 0
+        self._id = uuid4().hex
+        self._latest: dict[int, dict] = {}
+        # drone id -> seq of its last change, the oldest change first
+        self._changed: OrderedDict[int, int] = OrderedDict()
+        self._everything: set[Subscription] = set()
+        self._by_drone: dict[int, set[Subscription]] = {}
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._everything) + len(
+            {s for subscriptions in self._by_drone.values() for s in subscriptions}
+        )
+
+    @contextmanager
+    def subscribe(
+        self, drone_ids: Iterable[int] | None = None
+    ) -> Iterator[Subscription]:
+        subscription = Subscription(self, set(drone_ids) if drone_ids else None)
+        if subscription.drone_ids is None:
+            self._everything.add(subscription)
+        for drone_id in subscription.drone_ids or ():
+            self._by_drone.setdefault(drone_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._everything.discard(subscription)
+            for drone_id in subscription.drone_ids or ():
+                subscriptions = self._by_drone[drone_id]
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._by_drone[drone_id]
+
+    def changes_since(self, seq: int, drone_ids: set[int] | None = None) -> list[dict]:
+        """Latest state of the drones changed after `seq`"""
+        if drone_ids is not None:
+            return [
+                {"id": drone_id, **self._latest[drone_id]}
+                for drone_id in sorted(drone_ids)
+                if self._changed.get(drone_id, 0) > seq
+            ]
+        batch = []
+        for drone_id in reversed(self._changed):
+            if self._changed[drone_id] <= seq:
+                break
+            batch.append({"id": drone_id, **self._latest[drone_id]})
+        batch.reverse()
+        return batch
+
+    async def publish(self, changes: Mapping[int, Mapping]) -> None:
+        """
+        Send drone id -> changed fields, to be called once they are committed
+        """
+        changes = {
+            drone_id: {
+                key: value.value if isinstance(value, enum.Enum) else value
+                for key, value in change.items()
+                if key in EVENT_FIELDS
+            }
+            for drone_id, change in changes.items()
+        }
+        changes = {drone_id: change for drone_id, change in changes.items() if change}
+        if not changes:
+            return
+        self._deliver(changes)
+        if self.backend is None:
+            return
+        message = {"sender": self._id, "changes": changes}
+        try:
+            await self.backend.publish(self.channel, json.dumps(message).encode())
+        except Exception:
+            get_logger().exception("Can't relay the drone events")
+
+    async def start(self) -> None:
+        """Receive the changes published by the other workers"""
+        if self.backend is not None and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def _deliver(self, changes: Mapping[int, Mapping]) -> None:
+        self.seq += 1
+        for drone_id, change in changes.items():
+            self._latest.setdefault(drone_id, {}).update(change)
+            self._changed[drone_id] = self.seq
+            self._changed.move_to_end(drone_id)
+
+        for subscription in self._everything:
+            subscription.wake()
+        woken = set()
+        for drone_id in changes:
+            woken.update(self._by_drone.get(drone_id, ()))
+        for subscription in woken:
+            subscription.wake()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for raw in self.backend.subscribe(self.channel):
+                    message = json.loads(raw)
+                    if message["sender"] != self._id:
+                        changes = message["changes"].items()
+                        self._deliver({int(i): change for i, change in changes})
+            except Exception:
+                get_logger().exception("Lost the drone events channel")
+            await asyncio.sleep(1)
+
+
+async def server_sent_events(
+    subscription: Subscription, keepalive: float = 15
+) -> AsyncIterator[str]:
+    """
+    Format the batches of a subscription as Server-Sent Events, one event
+    per drone, a comment is sent when idle so proxies keep the stream open
+    """
+    while True:
+        try:
+            batch = await asyncio.wait_for(subscription.next_batch(), keepalive)
+        except asyncio.TimeoutError:
+            yield ": keepalive\n\n"
+            continue
+        yield "".join(f"event: drone\ndata: {json.dumps(c)}\n\n" for c in batch)
+
+
+drone_events = DroneEventHub(shared_cache.backend)
@@ -0,0 +1,62 @@
+import enum
+import json
+import zlib
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+from sqlalchemy import Table, select
+from src.config.database import async_session_maker
+from src.models.drone import Drone
+from src.models.load import Load, load_medication
+
+CHUNK_SIZE = 64 * 1024
+YIELD_PER = 1000
+
+
+class Export(enum.Enum):
+    DRONES = "drones"
+    LOADS = "loads"
+    LOAD_MEDICATIONS = "load_medications"
+
+
+EXPORT_TABLES: dict[Export, Table] = {
+    Export.DRONES: Drone.__table__,
+    Export.LOADS: Load.__table__,
+    Export.LOAD_MEDICATIONS: load_medication,
+}
+
+
+def _default(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def stream_ndjson(export: Export, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Stream every row of an exported table as NDJSON
+    - rows are fetched YIELD_PER at a time through a server side cursor
+    - lines are flushed in chunks of about CHUNK_SIZE bytes, gzip compressed
+    when `compress` is set
+    """
+    table = EXPORT_TABLES[export]
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+    encode = compressor.compress if compressor else bytes
+    query = select(table).order_by(*table.primary_key.columns)
+
+    async with async_session_maker() as session:
+        result = await session.stream(query, execution_options={"yield_per": YIELD_PER})
+        buffer = bytearray()
+        async for row in result.mappings():
+            buffer += json.dumps(dict(row), default=_default).encode()
+            buffer += b"\n"
+            if len(buffer) >= CHUNK_SIZE:
+                yield encode(buffer)
+                buffer.clear()
+
+    if compressor:
+        yield compressor.compress(buffer) + compressor.flush()
+    elif buffer:
+        yield bytes(buffer)
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import aiofiles.os
+from sqlalchemy import select, update
+from src.config.base_config import base_settings
+from src.config.database import async_session_maker
+from src.config.files import IMG_DIR
+from src.config.logs import get_logger
+from src.images import ImageVariant, render_variants, variant_filename
+from src.models.image_blob import ImageBlob
+from src.models.medication import Medication
+from src.services import (
+    bump_table_versions,
+    delete_unused_image_blobs,
+    invalidate_medication,
+)
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=base_settings.image_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def generate_variants(filename: str) -> dict[str, str]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), render_variants, IMG_DIR, filename)
+
+
+async def process_medication_image(medication_id: int, filename: str) -> None:
+    """
+    Record the variants of a medication's image, they are only generated
+    when no other medication shares the image
+    """
+    async with async_session_maker() as session:
+        query = (
+            select(Medication.variants)
+            .where(Medication.image == filename, Medication.variants.is_not(None))
+            .limit(1)
+        )
+        variants = await session.scalar(query)
+        if variants is None:
+            try:
+                variants = await generate_variants(filename)
+            except Exception:
+                get_logger().exception(f"Can't generate the variants of {filename}")
+                return
+        code = await session.scalar(
+            update(Medication)
+            .where(Medication.id == medication_id)
+            .values(variants=variants)
+            .returning(Medication.code)
+        )
+        await session.commit()
+        await bump_table_versions(session, "medication")
+    await invalidate_medication(medication_id, code)
+
+
+async def backfill() -> int:
+    """Generate the variants of every medication image missing them, spread
+    over the process pool"""
+    async with async_session_maker() as session:
+        query = select(Medication.id, Medication.image).where(
+            Medication.image.is_not(None), Medication.variants.is_(None)
+        )
+        rows = (await session.execute(query)).all()
+
+    await asyncio.gather(
+        *[
+            process_medication_image(medication_id, image)
+            for medication_id, image in rows
+        ]
+    )
+    return len(rows)
+
+
+async def collect_garbage() -> list[str]:
+    """Delete the image blobs no medication references, with their files"""
+    async with async_session_maker() as session:
+        filenames = await delete_unused_image_blobs(session)
+        # a concurrent upload may have registered the same content again
+        query = select(ImageBlob.filename).where(ImageBlob.filename.in_(filenames))
+        reused = set((await session.scalars(query)).all())
+
+    removed = [filename for filename in filenames if filename not in reused]
+    for filename in removed:
+        names = [filename] + [variant_filename(filename, v) for v in ImageVariant]
+        for name in names:
+            try:
+                await aiofiles.os.remove(os.path.join(IMG_DIR, name))
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Medication image jobs")
+    parser.add_argument("command", choices=["backfill", "gc"])
+    args = parser.parse_args()
+    if args.command == "backfill":
+        processed = asyncio.run(backfill())
+        shutdown_pool()
+        print(f"Processed {processed} medication images")
+    else:
+        removed = asyncio.run(collect_garbage())
+        print(f"Removed {len(removed)} unused images")
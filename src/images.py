@@ -0,0 +1,201 @@
+import enum
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageOps
+from src.config.files import IMG_DIR
+
+CHUNK_SIZE = 64 * 1024
+
+# mode of the files created by the process, the temporary uploads are created
+# owner-only and get it once published
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+# file signature -> extension of the accepted image formats
+SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": ".png",
+    b"\xff\xd8\xff": ".jpeg",
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class ImageTooLarge(ValueError):
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"The image exceeds the size limit of {max_size} bytes")
+
+
+def sniff_extension(head: bytes) -> str | None:
+    for signature, extension in SIGNATURES.items():
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+@dataclass
+class StagedImage:
+    """Upload written to a temporary file in IMG_DIR, waiting to be published"""
+
+    path: str
+    extension: str
+    size: int
+    digest: str = ""
+
+    @property
+    def filename(self) -> str:
+        """Content addressed name, the same image always gets the same name"""
+        return f"{self.digest}{self.extension}"
+
+    async def publish(self, filename: str) -> str:
+        """Atomically move the file to its final name in IMG_DIR, readable like
+        any other static file"""
+        destination = os.path.join(IMG_DIR, filename)
+        os.chmod(self.path, FILE_MODE)
+        await aiofiles.os.replace(self.path, destination)
+        self.path = destination
+        return destination
+
+    async def discard(self) -> None:
+        if os.path.dirname(self.path) == IMG_DIR and _is_temporary(self.path):
+            try:
+                await aiofiles.os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def _is_temporary(path: str) -> bool:
+    return os.path.basename(path).startswith(".upload-")
+
+
+async def stage_upload(image: UploadFile, max_size: int) -> StagedImage:
+    """
+    Stream an upload to a temporary file in CHUNK_SIZE pieces
+    - the format is taken from the magic bytes of the first chunk, not from
+    the client's content type
+    - the sha256 digest is computed while streaming
+    - raises InvalidImage or ImageTooLarge, the temporary file is removed
+    """
+    first_chunk = await image.read(CHUNK_SIZE)
+    extension = sniff_extension(first_chunk)
+    if extension is None:
+        raise InvalidImage("Only .jpeg or .png files allowed")
+
+    async with aiofiles.tempfile.NamedTemporaryFile(
+        dir=IMG_DIR, prefix=".upload-", suffix=extension, delete=False
+    ) as f:
+        staged = StagedImage(path=f.name, extension=extension, size=0)
+        digest = hashlib.sha256()
+        try:
+            chunk = first_chunk
+            while chunk:
+                staged.size += len(chunk)
+                if staged.size > max_size:
+                    raise ImageTooLarge(max_size)
+                digest.update(chunk)
+                await f.write(chunk)
+                chunk = await image.read(CHUNK_SIZE)
+        except BaseException:
+            await f.close()
+            await staged.discard()
+            raise
+
+    staged.digest = digest.hexdigest()
+    return staged
+
+
+# name of a file stored under the sha256 digest of its content
+CONTENT_ADDRESSED = re.compile(r"[0-9a-f]{64}\.[a-z]+")
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Static files, the images stored under their content hash never change
+    once written so clients can cache them for good
+    - the other files keep the default headers
+    """
+
+    cache_control = "public, max-age=31536000, immutable"
+
+    def file_response(self, full_path, *args, **kwargs):
+        response = super().file_response(full_path, *args, **kwargs)
+        if CONTENT_ADDRESSED.fullmatch(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = self.cache_control
+        return response
+
+
+VARIANT_FORMAT = "WEBP"
+VARIANT_QUALITY = 80
+
+
+class ImageVariant(enum.Enum):
+    THUMBNAIL = "thumbnail"
+    SMALL = "small"
+    MEDIUM = "medium"
+
+
+# longest side in pixels of every variant
+VARIANT_SIZES = {
+    ImageVariant.THUMBNAIL: 128,
+    ImageVariant.SMALL: 320,
+    ImageVariant.MEDIUM: 800,
+}
+
+
+def variant_filename(filename: str, variant: ImageVariant) -> str:
+    stem, _ = os.path.splitext(filename)
+    return f"{stem}_{variant.value}.webp"
+
+
+class ImageUrls:
+    """
+    Turn the stored image file names into the URLs clients fetch them from
+    - `base_url` is read once per request, the stored names are never changed
+    - with a `variant` its file is used when it has already been generated
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def resolve(
+        self,
+        filename: str | None,
+        variants: dict[str, str] | None = None,
+        variant: ImageVariant | None = None,
+    ) -> str | None:
+        if variant and variants and variant.value in variants:
+            filename = variants[variant.value]
+        return f"{self.base_url}/{filename}" if filename else None
+
+
+def render_variants(directory: str, filename: str) -> dict[str, str]:
+    """
+    Resize and recompress an image to every variant, CPU bound so it runs in
+    a worker process
+    - returns variant name -> file name in `directory`
+    """
+    variants = {}
+    with Image.open(os.path.join(directory, filename)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for variant, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size))
+            name = variant_filename(filename, variant)
+            resized.save(
+                os.path.join(directory, name),
+                VARIANT_FORMAT,
+                quality=VARIANT_QUALITY,
+            )
+            variants[variant.value] = name
+    return variants
@@ -1,70 +1,180 @@
-from collections.abc import Mapping
-from uuid import uuid4
-import aiofiles
-from fastapi import Depends, FastAPI, Form, HTTPException, status, UploadFile
-from fastapi.staticfiles import StaticFiles
-from src.models.drone import Status
+import asyncio
+from collections.abc import Callable, Mapping, Sequence
+from contextlib import suppress
+from operator import attrgetter, itemgetter
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    Form,
+    HTTPException,
+    Query,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from src.schemas.load import Load, LoadCreate
+from src.schemas.load import DispatchCreate, Load, LoadCreate
+from src.models.load import Load as LoadModel
+from src.packing import PackingStrategy, utilisation
+from src.export import Export, stream_ndjson
+from src.state_machine import InvalidTransition
+from src.images import ImageUrls, ImageVariant, ImmutableStaticFiles, StagedImage
+from src.image_variants import process_medication_image, shutdown_pool
+from src.bulk_import import DRONE_IMPORT, MEDICATION_IMPORT, bulk_import
 
 from .dependencies import (
+    admin_access,
     drone_has_been_loaded,
     drones_avaliable,
     valid_drone_id,
     valid_medication_id,
     drone_is_avaliable,
     drone_can_carry_load,
+    drones_can_carry_order,
+    drone_filters,
+    image_urls,
+    import_rows,
+    page_params,
+    table_etag,
+    valid_image,
 )
 from .services import (
+    acquire_image_blob,
     get_drones,
     get_drone_by_serial_number as get_by_serial_number,
+    advance_drone_states,
+    change_drone_state,
+    claim_drones,
     create_drone,
     create_medication,
+    dispatch_loads,
     get_medication_by_code,
-    get_medication_by_load,
-    get_medications,
+    get_cached_available_drones,
+    get_cached_medications,
     load_drone,
     update_and_check_battery,
-    update_drone,
 )
-from src.schemas.drone import Drone, DroneCreate, DroneLoading, DroneLoads
+from src.schemas.drone import (
+    Dispatch,
+    Drone,
+    DroneCreate,
+    DroneLoading,
+    DroneLoads,
+    DroneStateChange,
+)
 from src.schemas.medication import MedicationCreate, Medication
+from src.schemas.bulk_import import ImportReport
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.config.database import get_async_session
-import os
-from src.config.files import STATIC_FILES_DIR, IMG_DIR
+from src.config.database import async_engine, get_async_session
+from src.config.files import STATIC_FILES_DIR
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from src.config.base_config import base_settings
-from tests.utils.seed_db import seed_db
+from src.cache import shared_cache
+from src.events import Subscription, drone_events, server_sent_events
+from src.metrics import MetricsMiddleware, instrument_engine, registry, timed_job
+from src.schemas.seed import SeedSpec
+from src.seed import seed_in_background, seeding
 
 app = FastAPI()
-
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+instrument_engine(async_engine)
 
 scheduler = AsyncIOScheduler()
 
 
 async def check_battery():
-    await update_and_check_battery()
+    with timed_job("check_battery"):
+        await update_and_check_battery()
+
+
+async def advance_states():
+    with timed_job("advance_drone_states"):
+        await advance_drone_states()
 
 
 @app.on_event("startup")
 async def start_background_task():
     interval = base_settings.check_battery_interval
     scheduler.add_job(check_battery, "interval", minutes=interval, id="check_battery")
+    scheduler.add_job(
+        advance_states,
+        "interval",
+        seconds=base_settings.state_check_interval,
+        id="advance_drone_states",
+    )
     scheduler.start()
+    await shared_cache.start()
+    await drone_events.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_task():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await drone_events.close()
+    await shared_cache.close()
+    shutdown_pool()
+
+
+def _medication_schema(
+    medication: Mapping,
+    urls: ImageUrls,
+    variant: ImageVariant | None = None,
+) -> dict:
+    """Response fields of a medication from its column values, validated once
+    by the response model"""
+    return {
+        "id": medication["id"],
+        "name": medication["name"],
+        "weight": medication["weight"],
+        "code": medication["code"],
+        "image": urls.resolve(medication["image"], medication["variants"], variant),
+    }
 
 
-app.mount(STATIC_FILES_DIR, StaticFiles(directory="static"), name="static")
+def _load_schema(db_load: LoadModel, medications: list, urls: ImageUrls) -> Load:
+    medications = [_medication_schema(m, urls) for m in medications]
+    return Load(**db_load.column_values(), medications=medications)
+
+
+app.mount(STATIC_FILES_DIR, ImmutableStaticFiles(directory="static"), name="static")
+
+
+def _paginate(
+    response: Response,
+    rows: Sequence,
+    limit: int,
+    id_of: Callable = attrgetter("id"),
+) -> Sequence:
+    """Trim the extra row fetched to detect a next page and expose its cursor"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(id_of(rows[-1]))
+    return rows
 
 
 @app.get("/drones/", response_model=list[Drone])
-async def list_drones(session: AsyncSession = Depends(get_async_session)):
-    result = await get_drones(session)
-    return result
+async def list_drones(
+    response: Response,
+    etag: str = Depends(table_etag("drone")),
+    page: dict = Depends(page_params),
+    filters: dict = Depends(drone_filters),
+    session: AsyncSession = Depends(get_async_session),
+):
+    result = await get_drones(
+        session, after=page["after"], limit=page["limit"] + 1, **filters
+    )
+    return _paginate(response, result, page["limit"])
 
 
 @app.get("/drones/{drone_id}", response_model=Drone)
-async def get_drone(drone: Mapping = Depends(valid_drone_id)):
+async def get_drone(
+    etag: str = Depends(table_etag("drone")),
+    drone: Mapping = Depends(valid_drone_id),
+):
     return drone
 
 
@@ -81,23 +191,76 @@ async def create_new_drone(
     return await create_drone(session, drone)
 
 
+# the body is parsed by import_rows, it isn't declared as a parameter
+IMPORT_BODY = {
+    "requestBody": {
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": {}}},
+            "text/csv": {"schema": {"type": "string"}},
+        }
+    }
+}
+
+
+@app.post("/drones/bulk/", response_model=ImportReport, openapi_extra=IMPORT_BODY)
+async def import_drones(
+    rows=Depends(import_rows), session: AsyncSession = Depends(get_async_session)
+):
+    return await bulk_import(session, DRONE_IMPORT, rows)
+
+
+@app.patch("/drones/{drone_id}/state/", response_model=Drone)
+async def change_state(
+    state_change: DroneStateChange,
+    drone: Mapping = Depends(valid_drone_id),
+    session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        await change_drone_state(session, drone, state_change.state)
+    except InvalidTransition as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return drone
+
+
 @app.get("/medications/", response_model=list[Medication])
-async def list_medications(session: AsyncSession = Depends(get_async_session)):
-    result = await get_medications(session)
-    return result
+async def list_medications(
+    response: Response,
+    etag: str = Depends(table_etag("medication")),
+    page: dict = Depends(page_params),
+    code_prefix: str | None = Query(default=None, regex=r"^[A-Z_\d]+$"),
+    variant: ImageVariant | None = None,
+    urls: ImageUrls = Depends(image_urls),
+    session: AsyncSession = Depends(get_async_session),
+):
+    result = await get_cached_medications(
+        session,
+        after=page["after"],
+        limit=page["limit"] + 1,
+        code_prefix=code_prefix,
+        etag=etag,
+    )
+    rows = _paginate(response, result, page["limit"], itemgetter("id"))
+    return [_medication_schema(row, urls, variant) for row in rows]
 
 
 @app.get("/medications/{medication_id}", response_model=Medication)
-async def get_medication(medication: Mapping = Depends(valid_medication_id)):
-    return medication
+async def get_medication(
+    etag: str = Depends(table_etag("medication")),
+    variant: ImageVariant | None = None,
+    medication: Mapping = Depends(valid_medication_id),
+    urls: ImageUrls = Depends(image_urls),
+):
+    return _medication_schema(medication, urls, variant)
 
 
 @app.post("/medications/", response_model=Medication)
 async def create_new_medication(
+    background_tasks: BackgroundTasks,
     name: str = Form(regex="^[A-Za-z0-9_-]*$"),
     weight: int = Form(gt=0),
     code: str = Form(regex=r"^[A-Z_\d]+$"),
-    image: UploadFile | None = None,
+    image: StagedImage | None = Depends(valid_image),
+    urls: ImageUrls = Depends(image_urls),
     session: AsyncSession = Depends(get_async_session),
 ):
     db_medication = await get_medication_by_code(session, code=code)
@@ -107,87 +270,188 @@ async def create_new_medication(
         )
     medication = MedicationCreate(name=name, code=code, weight=weight)
     if image:
-        if image.content_type not in ["image/png", "image/jpeg"]:
-            raise HTTPException(
-                status_code=status.HTTP_406_NOT_ACCEPTABLE,
-                detail="Only .jpeg or .png files allowed",
-            )
-
-        _, ext = os.path.splitext(image.filename)
-        content = await image.read()
-
-        filename = f"{uuid4().hex}{ext}"
-        async with aiofiles.open(os.path.join(IMG_DIR, filename), mode="wb") as f:
-            await f.write(content)
+        filename = image.filename
+        created = await acquire_image_blob(session, image.digest, filename, image.size)
         result = await create_medication(session, medication, filename)
-        file_location = os.path.abspath(os.path.join(IMG_DIR, filename))
-        result.image = file_location
+        # only published once the row is committed, the upload of a blob
+        # already stored is discarded along with the staged file
+        if created:
+            await image.publish(filename)
+        background_tasks.add_task(process_medication_image, result.id, filename)
     else:
         result = await create_medication(session, medication)
-    return result
+    return _medication_schema(result.column_values(), urls)
+
+
+@app.post("/medications/bulk/", response_model=ImportReport, openapi_extra=IMPORT_BODY)
+async def import_medications(
+    rows=Depends(import_rows), session: AsyncSession = Depends(get_async_session)
+):
+    return await bulk_import(session, MEDICATION_IMPORT, rows)
 
 
 @app.post("/drones/{drone_id}/loading/", response_model=DroneLoading)
 async def loading_drone(
     load: LoadCreate,
     drone: Mapping = Depends(drone_is_avaliable),
+    urls: ImageUrls = Depends(image_urls),
     session: AsyncSession = Depends(get_async_session),
 ):
-    await update_drone(session, drone.id, state=Status.LOADING)
-    can_be_carry = await drone_can_carry_load(drone, load.medications, session)
-    if len(can_be_carry.get("medications")):
-        result = await load_drone(
-            session,
-            drone.id,
-            load,
-            can_be_carry.get("medications"),
-            can_be_carry.get("weight_loaded"),
+    if not await claim_drones(session, [drone.id]):
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The drone is already being loaded",
         )
-    else:
-        await update_drone(session, drone.id, state=Status.IDLE)
+    can_be_carry = await drone_can_carry_load(
+        drone, load.medications, session, load.strategy, load.priorities
+    )
+    if not can_be_carry.get("medications"):
+        # releases the claim, the drone stays IDLE
+        await session.rollback()
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail="Neither medication could be loaded.",
         )
-
-    drone_ = drone.__dict__
-    drone_.pop("_sa_instance_state")
-    load_ = result.__dict__
-    load_.pop("_sa_instance_state")
-    load_schema = Load(**load_, medications=can_be_carry.get("medications"))
-
-    respose = DroneLoading(**drone_, load=load_schema)
-    return respose
+    result = await load_drone(
+        session,
+        drone.id,
+        load,
+        can_be_carry.get("medications"),
+        can_be_carry.get("weight_loaded"),
+    )
+
+    return DroneLoading(
+        **Drone.from_orm(drone).dict(),
+        load=_load_schema(result, can_be_carry.get("medications"), urls),
+        strategy=load.strategy,
+        utilisation=utilisation(result.weight_loaded, drone.weight_limit),
+    )
+
+
+@app.post("/drones/dispatch/", response_model=Dispatch)
+async def dispatch_order(
+    order: DispatchCreate,
+    drones: list[Drone] = Depends(drones_avaliable),
+    urls: ImageUrls = Depends(image_urls),
+    session: AsyncSession = Depends(get_async_session),
+):
+    plan = await drones_can_carry_order(drones, order.medications, session)
+    assignments = plan.get("assignments")
+    if not assignments:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Neither medication could be loaded.",
+        )
+    if not await claim_drones(session, [drone.id for drone, _ in assignments]):
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Some drones were taken by another request, try again",
+        )
+    db_loads = await dispatch_loads(session, order, assignments)
+
+    loads = []
+    for db_load, (drone, medications) in zip(db_loads, assignments):
+        load_schema = _load_schema(db_load, medications, urls)
+        loads.append(
+            DroneLoading(
+                **Drone.from_orm(drone).dict(),
+                load=load_schema,
+                strategy=PackingStrategy.FIRST_FIT_DECREASING,
+                utilisation=utilisation(db_load.weight_loaded, drone.weight_limit),
+            )
+        )
+    return Dispatch(loads=loads, unassigned=plan.get("unassigned"))
 
 
 @app.get("/drones/{drone_id}/loaded/", response_model=DroneLoads)
 async def loads_by_drone_id(
     drone: dict[str, Mapping] = Depends(drone_has_been_loaded),
-    session: AsyncSession = Depends(get_async_session),
+    urls: ImageUrls = Depends(image_urls),
 ):
-    drone_ = drone.get("drone").__dict__
-    drone_.pop("_sa_instance_state")
-    if drone.get("loads"):
-        drone_loads = []
-        for load in drone.get("loads"):
-            medications = await get_medication_by_load(session, load.id)
-            load_ = load.__dict__
-            load_.pop("_sa_instance_state")
-            load_schema = Load(**load_, medications=medications)
-            drone_loads.append(load_schema)
-
-        respose = DroneLoads(**drone_, loads=drone_loads)
-    else:
-        respose = DroneLoads(**drone_, loads=[])
-    return respose
+    drone_loads = [
+        _load_schema(load, medications, urls)
+        for load, medications in drone.get("loads")
+    ]
+    return DroneLoads(**Drone.from_orm(drone.get("drone")).dict(), loads=drone_loads)
+
+
+@app.get("/drones/events/", response_class=StreamingResponse)
+async def stream_drone_events(drone_id: list[int] | None = Query(default=None)):
+    """Server-Sent Events with the state and battery changes of the drones,
+    all of them or the given `drone_id`s"""
+
+    async def stream():
+        with drone_events.subscribe(drone_id) as subscription:
+            async for event in server_sent_events(subscription):
+                yield event
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.websocket("/drones/events/ws")
+async def drone_events_socket(
+    websocket: WebSocket, drone_id: list[int] | None = Query(default=None)
+):
+    """Same changes as /drones/events/, each message is a JSON list of them"""
+    await websocket.accept()
+    with drone_events.subscribe(drone_id) as subscription:
+        sender = asyncio.create_task(_send_events(websocket, subscription))
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+            with suppress(asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+                await sender
+
+
+async def _send_events(websocket: WebSocket, subscription: Subscription):
+    while True:
+        await websocket.send_json(await subscription.next_batch())
 
 
 @app.get("/drones/available/", response_model=list[Drone])
-async def get_available_drones(drones: list[Drone] = Depends(drones_avaliable)):
-    return drones
+async def get_available_drones(
+    etag: str = Depends(table_etag("drone")),
+    session: AsyncSession = Depends(get_async_session),
+):
+    return await get_cached_available_drones(session, etag)
+
+
+@app.get("/export/{export}/", response_class=StreamingResponse)
+async def export_table(export: Export, gzip: bool = False):
+    headers = {"Content-Encoding": "gzip"} if gzip else None
+    return StreamingResponse(
+        stream_ndjson(export, compress=gzip),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        await registry.render(), media_type="text/plain; version=0.0.4"
+    )
 
-@app.get("/drones/seed_db/", status_code=200)
-async def seed_data_base():
-    await seed_db()
-    return {"detail": "The database was seeded with drones and medications."}
+
+@app.post(
+    "/admin/seed/",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(admin_access)],
+)
+async def seed_data_base(spec: SeedSpec, background_tasks: BackgroundTasks):
+    """Replace the data with generated rows, the tables are dropped"""
+    if seeding.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The database is being seeded",
+        )
+    # taken right away so the next request gets the 409, the task releases it
+    await seeding.acquire()
+    background_tasks.add_task(seed_in_background, spec)
+    return {"detail": "Seeding the database, see the logs for the outcome."}
@@ -0,0 +1,354 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.cache import medications_by_code, medications_by_id
+from src.config.base_config import base_settings
+from src.config.database import async_session_maker
+from src.config.logs import log_stats
+from src.config.pool import pool_metrics
+from src.events import drone_events
+from src.models.drone import Status
+from src.services import get_fleet_counts
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.samples()
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Sample lines of the metric in the text format"""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, value: float, *labels) -> None:
+        """For the totals counted elsewhere and collected on a scrape"""
+        self.values[labels] = value
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+
+class Histogram(Metric):
+    """
+    Cumulative buckets are only summed when rendered, an observation is a
+    bisect and three additions
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket and +Inf, sum]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels, count: int = 1) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += count
+        series[1] += value * count
+
+    def samples(self) -> Iterator[str]:
+        bounds = [*map(_number, self.buckets), "+Inf"]
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield (
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} "
+                    f"{cumulative}"
+                )
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    """
+    Metrics rendered in the Prometheus text format
+    - collectors run on each scrape to refresh the metrics read from
+    elsewhere, the fleet in the database or the cache statistics
+    - `enabled` False turns the request and query hooks into no-ops
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.metrics: list[Metric] = []
+        self.collectors: list[Callable[[], Awaitable[None]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def collector(
+        self, function: Callable[[], Awaitable[None]]
+    ) -> Callable[[], Awaitable[None]]:
+        self.collectors.append(function)
+        return function
+
+    async def render(self) -> str:
+        for collect in self.collectors:
+            await collect()
+        lines = [line for metric in self.metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.enabled = base_settings.metrics_enabled
+
+request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to answer a request, by route template",
+        ("method", "route", "status"),
+    )
+)
+request_queries = registry.register(
+    Histogram(
+        "http_request_queries",
+        "Statements sent to the database by a request",
+        ("method", "route"),
+        COUNT_BUCKETS,
+    )
+)
+request_query_duration = registry.register(
+    Histogram(
+        "http_request_query_duration_seconds",
+        "Time a request spent in the database",
+        ("method", "route"),
+    )
+)
+query_duration = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Time of a statement, by kind",
+        ("statement",),
+        QUERY_BUCKETS,
+    )
+)
+job_duration = registry.register(
+    Histogram(
+        "scheduler_job_duration_seconds",
+        "Time of a run of a scheduled job",
+        ("job",),
+    )
+)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0
+
+
+# statements of the request being served
+current_queries: ContextVar[QueryStats | None] = ContextVar(
+    "current_queries", default=None
+)
+
+
+def _statement_kind(statement: str) -> str:
+    kind = statement.lstrip()[:6].upper()
+    return kind if kind in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    if registry.enabled and context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    query_duration.observe(elapsed, _statement_kind(statement))
+    stats = current_queries.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement, and count it to the request running it"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _start_query)
+    event.listen(engine.sync_engine, "after_cursor_execute", _end_query)
+
+
+@contextmanager
+def timed_job(job: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        job_duration.observe(time.perf_counter() - start, job)
+
+
+class MetricsMiddleware:
+    """
+    Time the HTTP requests by route template, with the statements they sent
+    - the template comes from the endpoint the router picked, paths matching
+    no route share one label so ids in URLs don't create new series
+    """
+
+    def __init__(self, app: ASGIApp, routes: Iterable[BaseRoute] = ()):
+        self.app = app
+        self.routes = routes
+        self._templates: dict[Callable, str] | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stats = QueryStats()
+        token = current_queries.set(stats)
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            current_queries.reset(token)
+            method = scope["method"]
+            route = self._template(scope.get("endpoint"))
+            request_duration.observe(time.perf_counter() - start, method, route, status)
+            request_queries.observe(stats.count, method, route)
+            request_query_duration.observe(stats.seconds, method, route)
+
+    def _template(self, endpoint: Callable | None) -> str:
+        if self._templates is None:
+            # the router sets the endpoint of a route, or the app of a mount
+            self._templates = {
+                getattr(route, "endpoint", None) or route.app: route.path
+                for route in self.routes
+            }
+        return self._templates.get(endpoint, "unmatched")
+
+
+# metrics of the application, read on each scrape
+drones = registry.register(Gauge("drones", "Drones by state", ("state",)))
+drone_battery = registry.register(
+    Histogram(
+        "drone_battery_capacity_percent",
+        "Battery capacity of the fleet",
+        buckets=(0, 10, 25, 50, 75, 100),
+    )
+)
+cache_requests = registry.register(
+    Counter(
+        "cache_requests_total", "Lookups of the medication caches", ("cache", "result")
+    )
+)
+cache_evictions = registry.register(
+    Counter("cache_evictions_total", "Entries evicted by size", ("cache",))
+)
+pool_checkouts = registry.register(
+    Counter("db_pool_checkouts_total", "Connections taken from the pool")
+)
+pool_timeouts = registry.register(
+    Counter("db_pool_timeouts_total", "Checkouts given up, the pool was exhausted")
+)
+pool_wait = registry.register(
+    Counter("db_pool_wait_seconds_total", "Time spent waiting for a connection")
+)
+pool_waiting = registry.register(
+    Gauge("db_pool_waiting", "Requests waiting for a connection")
+)
+logs_lost = registry.register(
+    Counter(
+        "log_records_lost_total",
+        "Records dropped by a full log queue or by the rate limits",
+        ("reason",),
+    )
+)
+event_subscribers = registry.register(
+    Gauge("drone_event_subscribers", "Clients following the drone events")
+)
+
+
+@registry.collector
+async def collect_fleet() -> None:
+    async with async_session_maker() as session:
+        by_state, by_battery = await get_fleet_counts(session)
+    for state in Status:
+        drones.set(by_state.get(state, 0), state.value)
+    drone_battery.values.clear()
+    for battery_capacity, count in by_battery.items():
+        if battery_capacity is not None:
+            drone_battery.observe(battery_capacity, count=count)
+
+
+@registry.collector
+async def collect_runtime() -> None:
+    for name, cache in (("by_id", medications_by_id), ("by_code", medications_by_code)):
+        cache_requests.set(cache.stats.hits, name, "hit")
+        cache_requests.set(cache.stats.misses, name, "miss")
+        cache_evictions.set(cache.stats.evictions, name)
+    pool_checkouts.set(pool_metrics.checkouts)
+    pool_timeouts.set(pool_metrics.timeouts)
+    pool_wait.set(pool_metrics.wait_seconds)
+    pool_waiting.set(pool_metrics.waiting)
+    event_subscribers.set(len(drone_events))
+    for reason, count in log_stats().items():
+        logs_lost.set(count, reason)
@@ -17,5 +17,10 @@ class BaseModel(DeclarativeBase):
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
+    def column_values(self) -> dict:
+        return {column.key: getattr(self, column.key) for column in self.__table__.c}
+
 
 from .medication import Medication  # noqa
+from .image_blob import ImageBlob  # noqa
+from .table_version import TableVersion  # noqa
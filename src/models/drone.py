@@ -1,7 +1,11 @@
 import enum
+from datetime import datetime
 from sqlalchemy import (
     CheckConstraint,
+    DateTime,
     Enum,
+    Float,
+    Index,
     Integer,
     String,
 )
@@ -35,10 +39,24 @@ class Drone(BaseModel):
     battery_capacity: Mapped[int] = mapped_column(
         Integer, CheckConstraint("battery_capacity<=100"), default=100
     )
+    # fraction of a percent drained or recharged and not applied yet, see
+    # src.battery
+    battery_remainder: Mapped[float] = mapped_column(
+        Float, default=0, server_default="0"
+    )
     state: Mapped[Status] = mapped_column(Enum(Status), nullable=False)
+    # when the current state is due to move on, see src.state_machine
+    state_due_at: Mapped[datetime | None] = mapped_column(
+        DateTime, nullable=True, index=True
+    )
 
     loads: Mapped[list[Load]] = relationship(back_populates="drone")
 
+    __table_args__ = (
+        # the available drones, IDLE with enough battery
+        Index("drone_state_battery_capacity_idx", "state", "battery_capacity"),
+    )
+
     @validates("weight_limit")
     def validate_weight_limit(self, key, weight_limit):
         if 0 > weight_limit > 500:
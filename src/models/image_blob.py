@@ -0,0 +1,16 @@
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+from src.models.base_model import BaseModel
+
+
+class ImageBlob(BaseModel):
+    """
+    Image stored once under its content hash
+    - ref_count is the number of medications using it, blobs at 0 can be
+    garbage collected
+    """
+
+    digest: Mapped[str] = mapped_column(String(64), unique=True)
+    filename: Mapped[str] = mapped_column(String)
+    size: Mapped[int] = mapped_column(Integer)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0)
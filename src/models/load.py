@@ -5,6 +5,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
@@ -43,3 +44,9 @@ class Load(BaseModel):
     medications: Mapped[list[Medication]] = relationship(
         "Medication", secondary=load_medication, back_populates="loads"
     )
+
+    __table_args__ = (
+        # the loads of a drone, load_medication is reached through its
+        # primary key which starts with load_id
+        Index("load_drone_id_create_idx", "drone_id", "create"),
+    )
@@ -1,11 +1,16 @@
+from __future__ import annotations
 import re
+from typing import TYPE_CHECKING
 from sqlalchemy import (
+    JSON,
     Integer,
     String,
 )
 from sqlalchemy.orm import Mapped, mapped_column, validates, relationship
 from src.models.base_model import BaseModel
-from src.models.load import Load, load_medication
+
+if TYPE_CHECKING:
+    from src.models.load import Load
 
 
 class Medication(BaseModel):
@@ -13,9 +18,11 @@ class Medication(BaseModel):
     weight: Mapped[int] = mapped_column(Integer)
     code: Mapped[str] = mapped_column(String, unique=True)
     image: Mapped[str] = mapped_column(String, nullable=True)
+    # variant name -> file name of the resized copies of the image
+    variants: Mapped[dict[str, str] | None] = mapped_column(JSON, nullable=True)
 
     loads: Mapped[list[Load]] = relationship(
-        secondary=load_medication, back_populates="medications"
+        secondary="load_medication", back_populates="medications"
     )
 
     @validates("name")
@@ -0,0 +1,25 @@
+from sqlalchemy import Integer, String, event, insert
+from sqlalchemy.orm import Mapped, mapped_column
+from src.models.base_model import BaseModel
+
+# tables whose writes are counted
+VERSIONED_TABLES = ("drone", "medication", "load")
+
+
+class TableVersion(BaseModel):
+    """
+    Counter bumped once every write to a table is committed, the ETag of the
+    responses built from it
+    """
+
+    name: Mapped[str] = mapped_column(String(50), unique=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
+@event.listens_for(TableVersion.__table__, "after_create")
+def _insert_counters(table, connection, **kwargs):
+    connection.execute(
+        insert(table).values(
+            [{"name": name, "version": 0} for name in VERSIONED_TABLES]
+        )
+    )
@@ -0,0 +1,145 @@
+import enum
+from collections.abc import Sequence
+
+
+class PackingStrategy(enum.Enum):
+    FIRST_FIT = "FIRST_FIT"
+    KNAPSACK = "KNAPSACK"
+    PRIORITY = "PRIORITY"
+    DENSITY = "DENSITY"
+    FIRST_FIT_DECREASING = "FIRST_FIT_DECREASING"
+
+
+def first_fit(weights: Sequence[int], capacity: int) -> list[int]:
+    """Take every item, in order, that still fits in the remaining capacity."""
+    chosen = []
+    total = 0
+    for index, weight in enumerate(weights):
+        if total + weight <= capacity:
+            total += weight
+            chosen.append(index)
+    return chosen
+
+
+def max_weight(weights: Sequence[int], capacity: int) -> list[int]:
+    """
+    Exact 0/1 knapsack where the value of an item is its weight.
+    The reachable sums are kept as an int bitset, one snapshot per item,
+    so the table costs len(weights) * capacity bits.
+    """
+    mask = (1 << (capacity + 1)) - 1
+    reachable = 1
+    snapshots = []
+    for weight in weights:
+        snapshots.append(reachable)
+        if weight <= capacity:
+            reachable = (reachable | (reachable << weight)) & mask
+
+    remaining = reachable.bit_length() - 1
+    chosen = []
+    for index in range(len(weights) - 1, -1, -1):
+        if remaining == 0:
+            break
+        if not (snapshots[index] >> remaining) & 1:
+            # the sum was not reachable without this item
+            chosen.append(index)
+            remaining -= weights[index]
+    return sorted(chosen)
+
+
+def max_value(
+    weights: Sequence[int], values: Sequence[int], capacity: int
+) -> list[int]:
+    """
+    Exact 0/1 knapsack maximising the total value, ties are broken by the
+    heaviest load.
+    """
+    scale = capacity + 1
+    best = [0] * scale
+    taken_by_item = []
+    for weight, value in zip(weights, values):
+        gain = value * scale + weight
+        taken = bytearray(scale)
+        for size in range(capacity, weight - 1, -1):
+            candidate = best[size - weight] + gain
+            if candidate > best[size]:
+                best[size] = candidate
+                taken[size] = 1
+        taken_by_item.append(taken)
+
+    remaining = capacity
+    chosen = []
+    for index in range(len(weights) - 1, -1, -1):
+        if taken_by_item[index][remaining]:
+            chosen.append(index)
+            remaining -= weights[index]
+    return sorted(chosen)
+
+
+def greedy_by_density(
+    weights: Sequence[int], values: Sequence[int], capacity: int
+) -> list[int]:
+    """First fit over the items sorted by value per weight unit."""
+    order = sorted(
+        range(len(weights)), key=lambda i: values[i] / weights[i], reverse=True
+    )
+    chosen = first_fit([weights[i] for i in order], capacity)
+    return sorted(order[i] for i in chosen)
+
+
+def first_fit_decreasing(
+    weights: Sequence[int],
+    capacities: Sequence[int],
+    keys: Sequence | None = None,
+) -> list[list[int]]:
+    """
+    Bin packing heuristic, the heaviest items go first to the first bin
+    with room for them
+    - returns the indexes of the items assigned to each bin, ascending
+    - items with the same key never share a bin
+    """
+    remaining = list(capacities)
+    bins: list[list[int]] = [[] for _ in capacities]
+    bin_keys: list[set] = [set() for _ in capacities]
+    order = sorted(range(len(weights)), key=lambda i: weights[i], reverse=True)
+    for index in order:
+        weight = weights[index]
+        key = keys[index] if keys is not None else index
+        for position, room in enumerate(remaining):
+            if weight <= room and key not in bin_keys[position]:
+                remaining[position] -= weight
+                bins[position].append(index)
+                bin_keys[position].add(key)
+                break
+    return [sorted(items) for items in bins]
+
+
+def pack(
+    strategy: PackingStrategy,
+    weights: Sequence[int],
+    capacity: int,
+    values: Sequence[int] | None = None,
+) -> list[int]:
+    """
+    Choose the items to load with the given strategy
+    - returns the indexes of the chosen items in ascending order
+    - values default to 1 for the strategies that use them
+    """
+    if values is None:
+        values = [1] * len(weights)
+    match strategy:
+        case PackingStrategy.FIRST_FIT:
+            return first_fit(weights, capacity)
+        case PackingStrategy.KNAPSACK:
+            return max_weight(weights, capacity)
+        case PackingStrategy.PRIORITY:
+            return max_value(weights, values, capacity)
+        case PackingStrategy.DENSITY:
+            return greedy_by_density(weights, values, capacity)
+        case PackingStrategy.FIRST_FIT_DECREASING:
+            return first_fit_decreasing(weights, [capacity])[0]
+    raise ValueError(f"Unknown packing strategy {strategy}")
+
+
+def utilisation(weight_loaded: int, capacity: int) -> float:
+    return round(weight_loaded / capacity, 4) if capacity else 0.0
@@ -0,0 +1,16 @@
+from typing import Literal
+from pydantic import BaseModel
+
+
+class ImportedRow(BaseModel):
+    # position of the row in the import, the CSV header isn't counted
+    row: int
+    status: Literal["accepted", "rejected"]
+    id: int | None = None
+    errors: list[str] = []
+
+
+class ImportReport(BaseModel):
+    accepted: int = 0
+    rejected: int = 0
+    rows: list[ImportedRow] = []
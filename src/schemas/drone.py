@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from src.schemas.load import Load
 from src.models.drone import Status, Models
+from src.packing import PackingStrategy
 
 
 class DroneBase(BaseModel):
@@ -15,6 +16,10 @@ class DroneCreate(DroneBase):
     pass
 
 
+class DroneStateChange(BaseModel):
+    state: Status
+
+
 class Drone(DroneBase):
     id: int
 
@@ -24,6 +29,8 @@ class Drone(DroneBase):
 
 class DroneLoading(Drone):
     load: Load
+    strategy: PackingStrategy = PackingStrategy.FIRST_FIT
+    utilisation: float = Field(ge=0, le=1, default=0)
 
     class Config:
         orm_mode = True
@@ -34,3 +41,8 @@ class DroneLoads(Drone):
 
     class Config:
         orm_mode = True
+
+
+class Dispatch(BaseModel):
+    loads: list[DroneLoading] = []
+    unassigned: list[int] = []
@@ -1,5 +1,7 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
+
+from src.packing import PackingStrategy
 
 from src.schemas.medication import Medication
 
@@ -12,6 +14,13 @@ class LoadBase(BaseModel):
 
 class LoadCreate(LoadBase):
     medications: list[int]
+    strategy: PackingStrategy = PackingStrategy.FIRST_FIT
+    # medication id -> priority used by the PRIORITY and DENSITY strategies
+    priorities: dict[int, conint(gt=0)] = {}
+
+
+class DispatchCreate(LoadBase):
+    medications: list[int]
 
 
 class Load(LoadBase):
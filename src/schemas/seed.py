@@ -0,0 +1,58 @@
+from pydantic import BaseModel, Field, root_validator, validator
+from src.models.drone import Models, Status
+
+
+class SeedSpec(BaseModel):
+    """
+    Rows to generate, the same spec and seed give the same rows
+    - the distributions are relative weights of the values drawn, the ranges
+    are inclusive
+    """
+
+    drones: int = Field(ge=0, default=0)
+    medications: int = Field(ge=0, default=0)
+    loads: int = Field(ge=0, default=0)
+    seed: int = 0
+    states: dict[Status, float] = {
+        Status.IDLE: 50,
+        Status.LOADING: 5,
+        Status.LOADED: 10,
+        Status.DELIVERING: 15,
+        Status.DELIVERED: 5,
+        Status.RETURNING: 15,
+    }
+    models: dict[Models, float] = {model: 1 for model in Models}
+    battery_capacity: tuple[int, int] = (20, 100)
+    weight_limit: tuple[int, int] = (100, 500)
+    medication_weight: tuple[int, int] = (5, 100)
+    # medications in a load
+    load_sizes: dict[int, float] = {1: 5, 2: 3, 3: 2}
+
+    @validator("states", "models", "load_sizes")
+    def valid_weights(cls, weights):
+        if any(weight < 0 for weight in weights.values()) or not any(weights.values()):
+            raise ValueError("weights must be positive, one at least above 0")
+        return weights
+
+    @validator("load_sizes")
+    def valid_load_sizes(cls, load_sizes):
+        if min(load_sizes) < 1:
+            raise ValueError("a load holds one medication at least")
+        return load_sizes
+
+    @validator("battery_capacity", "weight_limit", "medication_weight")
+    def valid_range(cls, bounds, field):
+        low, high = {
+            "battery_capacity": (0, 100),
+            "weight_limit": (1, 500),
+            "medication_weight": (1, 500),
+        }[field.name]
+        if not low <= bounds[0] <= bounds[1] <= high:
+            raise ValueError(f"expected a range within {low}-{high}")
+        return bounds
+
+    @root_validator(skip_on_failure=True)
+    def loads_have_drones_and_medications(cls, values):
+        if values["loads"] and not (values["drones"] and values["medications"]):
+            raise ValueError("loads need drones and medications")
+        return values
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import random
+import time
+from array import array
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta
+from itertools import accumulate, chain, islice
+from sqlalchemy import Table, insert
+from src.cache import (
+    DRONES,
+    MEDICATIONS,
+    medications_by_code,
+    medications_by_id,
+    shared_cache,
+)
+from src.config.base_config import base_settings
+from src.config.database import async_engine, async_session_maker, custom_metadata
+from src.config.logs import get_logger
+from src.models.drone import Drone
+from src.models.load import Load, load_medication
+from src.models.medication import Medication
+from src.schemas.seed import SeedSpec
+from src.services import bump_table_versions
+from src.state_machine import state_machine
+
+# creation time of the first generated load, the next ones follow a minute apart
+LOADS_START = datetime(2023, 1, 1)
+
+# one seeding at a time, they drop the tables the other one fills
+seeding = asyncio.Lock()
+
+
+class Draw:
+    """Values drawn by their relative weights, the cumulative weights are
+    computed once instead of on every draw"""
+
+    def __init__(self, weights: dict, rng: random.Random):
+        self.values = list(weights)
+        self.cum_weights = list(accumulate(weights.values()))
+        self.rng = rng
+
+    def __call__(self):
+        return self.rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+
+def generate_drones(spec: SeedSpec, rng: random.Random) -> Iterator[dict]:
+    state = Draw(spec.states, rng)
+    model = Draw(spec.models, rng)
+    for i in range(spec.drones):
+        yield {
+            "serial_number": f"SEED{i:07d}",
+            "model": model(),
+            "weight_limit": rng.randint(*spec.weight_limit),
+            "battery_capacity": rng.randint(*spec.battery_capacity),
+            **state_machine.values(state()),
+        }
+
+
+def generate_medications(spec: SeedSpec, rng: random.Random) -> Iterator[dict]:
+    for i in range(spec.medications):
+        yield {
+            "code": f"SEED_{i:07d}",
+            "name": f"seed-{i}",
+            "weight": rng.randint(*spec.medication_weight),
+        }
+
+
+def generate_loads(
+    spec: SeedSpec,
+    rng: random.Random,
+    weight_limits: array,
+    weights: array,
+    links: list[dict],
+) -> Iterator[dict]:
+    """
+    Loads of random drones, the medications past the weight limit of the
+    drone are left out but the first one
+    - the ids follow the insertion order of the empty tables, the links to
+    the medications are added to `links`
+    """
+    size = Draw(spec.load_sizes, rng)
+    medication_ids = range(1, len(weights) + 1)
+    for load_id in range(1, spec.loads + 1):
+        drone_id = rng.randint(1, len(weight_limits))
+        picked = rng.sample(medication_ids, min(size(), len(weights)))
+        loaded = weights[picked[0] - 1]
+        links.append({"load_id": load_id, "medication_id": picked[0]})
+        for medication_id in picked[1:]:
+            weight = weights[medication_id - 1]
+            if loaded + weight <= weight_limits[drone_id - 1]:
+                loaded += weight
+                links.append({"load_id": load_id, "medication_id": medication_id})
+        yield {
+            "drone_id": drone_id,
+            "origin": "Seed",
+            "destination": "Seed",
+            "create": LOADS_START + timedelta(minutes=load_id),
+            "weight_loaded": loaded,
+        }
+
+
+def _kept(rows: Iterable[dict], key: str, values: array) -> Iterator[dict]:
+    """Pass the rows through, keeping their `key` column in `values`"""
+    for row in rows:
+        values.append(row[key])
+        yield row
+
+
+async def _insert(session, table: Table, rows: Iterable[dict], chunk_size: int) -> int:
+    """
+    Insert `rows` a chunk at a time as they are generated
+    - a chunk is one executemany of a statement compiled once, a multi-row
+    VALUES would be compiled again for every chunk
+    - Core tables, the ORM bulk path would look at every row
+    """
+    statement = insert(table)
+    rows = iter(rows)
+    count = 0
+    while chunk := list(islice(rows, chunk_size)):
+        await session.execute(statement, chunk)
+        count += len(chunk)
+    return count
+
+
+async def seed_database(
+    spec: SeedSpec,
+    drones: Iterable[dict] = (),
+    medications: Iterable[dict] = (),
+    chunk_size: int | None = None,
+) -> dict[str, int]:
+    """
+    Recreate the tables with `drones` and `medications` followed by the rows
+    generated from `spec`, returns the rows inserted by table
+    - the rows only depend on the spec, the due times of the scheduled
+    states count from now
+    - nothing is held in memory but the weights the loads are checked against
+    """
+    async with seeding:
+        return await _seed_database(spec, drones, medications, chunk_size)
+
+
+async def _seed_database(
+    spec: SeedSpec,
+    drones: Iterable[dict],
+    medications: Iterable[dict],
+    chunk_size: int | None,
+) -> dict[str, int]:
+    chunk_size = chunk_size or base_settings.seed_chunk_size
+    rng = random.Random(spec.seed)
+    weight_limits = array("H")
+    weights = array("H")
+    links: list[dict] = []
+    counts = {}
+    async with async_engine.begin() as conn:
+        await conn.run_sync(custom_metadata.drop_all)
+        await conn.run_sync(custom_metadata.create_all)
+    async with async_session_maker() as session:
+        drone_rows = _kept(
+            chain(drones, generate_drones(spec, rng)), "weight_limit", weight_limits
+        )
+        counts["drone"] = await _insert(
+            session, Drone.__table__, drone_rows, chunk_size
+        )
+        await session.commit()
+        medication_rows = _kept(
+            chain(medications, generate_medications(spec, rng)), "weight", weights
+        )
+        counts["medication"] = await _insert(
+            session, Medication.__table__, medication_rows, chunk_size
+        )
+        await session.commit()
+        loads = generate_loads(spec, rng, weight_limits, weights, links)
+        counts["load"] = 0
+        # the links of a chunk of loads go in after it, for the foreign keys
+        while chunk := list(islice(loads, chunk_size)):
+            counts["load"] += await _insert(session, Load.__table__, chunk, chunk_size)
+            await _insert(session, load_medication, links, chunk_size)
+            links.clear()
+        await session.commit()
+        await bump_table_versions(session, "drone", "medication", "load")
+    medications_by_id.clear()
+    medications_by_code.clear()
+    await shared_cache.invalidate(DRONES, MEDICATIONS)
+    return counts
+
+
+async def seed_in_background(spec: SeedSpec) -> None:
+    """Seed the database holding `seeding`, the caller took it when the
+    seeding was accepted"""
+    start = time.perf_counter()
+    try:
+        counts = await _seed_database(spec, (), (), None)
+    except Exception:
+        get_logger().exception("Seeding the database failed")
+        return
+    finally:
+        seeding.release()
+    get_logger().info(
+        "Seeded the database in %.1fs: %s", time.perf_counter() - start, counts
+    )
+
+
+def _weights(pairs: list[str]) -> dict[str, float]:
+    """VALUE=WEIGHT pairs of the command line"""
+    weights = {}
+    for pair in pairs:
+        value, _, weight = pair.partition("=")
+        weights[value] = float(weight or 1)
+    return weights
+
+
+def _range(text: str) -> tuple[int, int]:
+    low, _, high = text.partition("-")
+    return int(low), int(high or low)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replace the data with generated drones, medications and loads"
+    )
+    parser.add_argument("--drones", type=int, default=0)
+    parser.add_argument("--medications", type=int, default=0)
+    parser.add_argument("--loads", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--states", nargs="+", metavar="STATE=WEIGHT")
+    parser.add_argument("--models", nargs="+", metavar="MODEL=WEIGHT")
+    parser.add_argument("--load-sizes", nargs="+", metavar="SIZE=WEIGHT")
+    parser.add_argument("--battery-capacity", type=_range, metavar="LOW-HIGH")
+    parser.add_argument("--weight-limit", type=_range, metavar="LOW-HIGH")
+    parser.add_argument("--medication-weight", type=_range, metavar="LOW-HIGH")
+    parser.add_argument("--chunk-size", type=int)
+    args = parser.parse_args()
+    options = {
+        name: _weights(value) if name in ("states", "models", "load_sizes") else value
+        for name, value in vars(args).items()
+        if value is not None and name != "chunk_size"
+    }
+    spec = SeedSpec.parse_obj(options)
+    start = time.perf_counter()
+    counts = asyncio.run(seed_database(spec, chunk_size=args.chunk_size))
+    print(
+        f"Inserted {counts['drone']} drones, {counts['medication']} medications and "
+        f"{counts['load']} loads in {time.perf_counter() - start:.1f}s"
+    )
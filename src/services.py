@@ -1,35 +1,77 @@
-import os
-from collections.abc import Sequence
-from sqlalchemy import insert, select, update
+import asyncio
+from collections.abc import Iterable, Sequence
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.config.database import get_async_session
-from src.schemas.load import LoadCreate
-from src.config.files import IMG_DIR
+from src.schemas.load import LoadBase, LoadCreate
 from src.schemas.medication import MedicationCreate
-from src.models.drone import Drone, Status
+from src.models.drone import Drone, Models, Status
 from src.models.load import Load, load_medication
 from src.models.medication import Medication
-from src.schemas.drone import DroneCreate
+from src.models.image_blob import ImageBlob
+from src.models.table_version import TableVersion
+from src.events import drone_events
+from src.cache import (
+    DRONES,
+    MEDICATIONS,
+    medications_by_code,
+    medications_by_id,
+    shared_cache,
+)
+from src.schemas.drone import Drone as DroneSchema, DroneCreate
+from src.battery import BatterySimulation, battery_simulation
+from src.state_machine import StateMachine, check_transition, state_machine
+from src.config.base_config import base_settings
 from src.config.logs import get_logger
 
 
-async def get_drones(session: AsyncSession) -> Sequence[Drone]:
-    query = select(Drone)
+async def get_drones(
+    session: AsyncSession,
+    after: int | None = None,
+    limit: int | None = None,
+    state: Status | None = None,
+    model: Models | None = None,
+    battery_min: int | None = None,
+    battery_max: int | None = None,
+) -> Sequence[Drone]:
+    """Drones ordered by id, `after` is the last id of the previous page"""
+    query = select(Drone).order_by(Drone.id)
+    if after is not None:
+        query = query.where(Drone.id > after)
+    if state is not None:
+        query = query.where(Drone.state == state)
+    if model is not None:
+        query = query.where(Drone.model == model)
+    if battery_min is not None:
+        query = query.where(Drone.battery_capacity >= battery_min)
+    if battery_max is not None:
+        query = query.where(Drone.battery_capacity <= battery_max)
+    if limit is not None:
+        query = query.limit(limit)
     result = await session.scalars(query)
 
     return result.all()
 
 
-async def get_medications(session: AsyncSession) -> Sequence[Medication]:
-    query = select(Medication)
+async def get_medications(
+    session: AsyncSession,
+    after: int | None = None,
+    limit: int | None = None,
+    code_prefix: str | None = None,
+) -> Sequence[Medication]:
+    """Medications ordered by id, `after` is the last id of the previous page"""
+    query = select(Medication).order_by(Medication.id)
+    if after is not None:
+        query = query.where(Medication.id > after)
+    if code_prefix:
+        query = query.where(Medication.code.startswith(code_prefix, autoescape=True))
+    if limit is not None:
+        query = query.limit(limit)
     result = await session.scalars(query)
-    rows = result.all()
-    for row in rows:
-        if row.image:
-            file_location = os.path.abspath(os.path.join(IMG_DIR, row.image))
-            row.image = file_location
 
-    return rows
+    return result.all()
 
 
 async def get_drone_by_id(session: AsyncSession, drone_id: int) -> Drone | None:
@@ -47,26 +89,99 @@ async def get_drone_by_serial_number(
 
 async def get_medication_by_id(
     session: AsyncSession, medication_id: int
-) -> Medication | None:
-    result = await session.get(Medication, medication_id)
-    if result and result.image:
-        file_location = os.path.abspath(os.path.join(IMG_DIR, result.image))
-        result.image = file_location
-    return result
+) -> dict | None:
+    """
+    Column values of a medication, read through the medication cache
+    - the cache holds column values rather than the instances, a rollback of
+    the session that loaded them would expire them for every request
+    """
 
+    async def load() -> dict | None:
+        medication = await session.get(Medication, medication_id)
+        return medication.column_values() if medication else None
 
-async def get_medication_by_code(session: AsyncSession, code: str) -> Medication | None:
-    query = select(Medication).where(Medication.code == code)
-    result = await session.execute(query)
-    row = result.first()
+    return await medications_by_id.get_or_load(medication_id, load)
+
+
+async def get_medications_by_ids(
+    session: AsyncSession, medication_ids: Iterable[int]
+) -> dict[int, dict]:
+    """Resolve many medication ids to their column values keyed by id, the
+    ones missing from the cache with a single query."""
+
+    async def load(ids: list[int]) -> dict[int, dict]:
+        query = select(Medication).where(Medication.id.in_(ids))
+        result = await session.scalars(query)
+        return {row.id: row.column_values() for row in result.all()}
+
+    return await medications_by_id.get_many(medication_ids, load)
 
-    return row[0] if row else None
+
+async def get_medication_by_code(session: AsyncSession, code: str) -> dict | None:
+    async def load() -> dict | None:
+        query = select(Medication).where(Medication.code == code)
+        result = await session.execute(query)
+        row = result.first()
+        return row[0].column_values() if row else None
+
+    return await medications_by_code.get_or_load(code, load)
+
+
+async def invalidate_medication(medication_id: int, code: str | None = None) -> None:
+    """To be called once a write to a medication row is committed"""
+    medications_by_id.invalidate(medication_id)
+    if code is not None:
+        medications_by_code.invalidate(code)
+    await shared_cache.invalidate(MEDICATIONS)
+
+
+async def get_cached_medications(
+    session: AsyncSession,
+    after: int | None = None,
+    limit: int | None = None,
+    code_prefix: str | None = None,
+    etag: str = "",
+) -> list[dict]:
+    """Column values of a page of medications, from the shared cache"""
+
+    async def load() -> list[dict]:
+        rows = await get_medications(session, after, limit, code_prefix)
+        return [row.column_values() for row in rows]
+
+    key = f"{etag}:{after}:{limit}:{code_prefix}"
+    return await shared_cache.get_or_load(MEDICATIONS, key, load)
+
+
+async def bump_table_versions(session: AsyncSession, *tables: str) -> None:
+    """
+    Count a write to `tables`, to be called once it's committed
+    - a transaction of its own, the counter of a table is only locked for
+    the UPDATE and not for the length of every write to the table
+    - a response read in between gets the new rows with the previous
+    version, never the previous rows with the new one
+    """
+    await session.execute(
+        update(TableVersion)
+        .where(TableVersion.name.in_(tables))
+        .values(version=TableVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+async def get_table_versions(session: AsyncSession, tables: Iterable[str]) -> dict:
+    query = select(TableVersion.name, TableVersion.version).where(
+        TableVersion.name.in_(tables)
+    )
+    return dict((await session.execute(query)).all())
 
 
 async def create_drone(session: AsyncSession, drone: DroneCreate) -> Drone:
-    db_drone = Drone(**drone.dict())
+    db_drone = Drone(**drone.dict(), state_due_at=state_machine.due_at(drone.state))
     session.add(db_drone)
     await session.commit()
+    await bump_table_versions(session, "drone")
+    await shared_cache.invalidate(DRONES)
     return db_drone
 
 
@@ -76,81 +191,338 @@ async def create_medication(
     db_medication = Medication(**medication.dict(), image=image)
     session.add(db_medication)
     await session.commit()
+    await bump_table_versions(session, "medication")
+    await invalidate_medication(db_medication.id, db_medication.code)
     return db_medication
 
 
+async def acquire_image_blob(
+    session: AsyncSession, digest: str, filename: str, size: int
+) -> bool:
+    """
+    Add a reference to the image stored under `digest` inside the current
+    transaction, registering it when it's new
+    - returns True when the blob was created and its file must be published
+    """
+    query = (
+        update(ImageBlob)
+        .where(ImageBlob.digest == digest)
+        .values(ref_count=ImageBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if (await session.execute(query)).rowcount:
+        return False
+    try:
+        async with session.begin_nested():
+            session.add(
+                ImageBlob(digest=digest, filename=filename, size=size, ref_count=1)
+            )
+    except IntegrityError:
+        # registered by a concurrent upload in the meantime
+        await session.execute(query)
+        return False
+    return True
+
+
+async def release_image_blob(session: AsyncSession, filename: str) -> None:
+    """Drop a reference to an image, to be called when a medication stops
+    using it"""
+    await session.execute(
+        update(ImageBlob)
+        .where(ImageBlob.filename == filename)
+        .values(ref_count=ImageBlob.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def delete_unused_image_blobs(session: AsyncSession) -> list[str]:
+    """Delete the blobs nobody references and return their file names"""
+    query = (
+        delete(ImageBlob)
+        .where(ImageBlob.ref_count <= 0)
+        .returning(ImageBlob.filename)
+        .execution_options(synchronize_session=False)
+    )
+    filenames = (await session.scalars(query)).all()
+    await session.commit()
+    return filenames
+
+
+async def claim_drones(session: AsyncSession, drone_ids: list[int]) -> bool:
+    """
+    Move the drones from IDLE to LOADING inside the current transaction
+    - the UPDATE is conditional on the state, so a drone can only be claimed
+    by one transaction
+    - returns False when any of them was already taken, the caller must then
+    roll back
+    """
+    check_transition(Status.IDLE, Status.LOADING)
+    query = (
+        update(Drone)
+        .where(
+            Drone.id.in_(drone_ids),
+            Drone.state == Status.IDLE,
+            Drone.battery_capacity >= 25,
+        )
+        .values(**state_machine.values(Status.LOADING))
+    )
+    result = await session.execute(query)
+    return result.rowcount == len(set(drone_ids))
+
+
 async def load_drone(
     session: AsyncSession,
     drone_id: int,
     load: LoadCreate,
-    medications: list[Medication],
+    medications: list[dict],
     weight_loaded: int,
 ):
-    load_attributes = load.dict()
-    load_attributes.pop("medications")
+    """Insert the load, link its medications and mark the drone as LOADED in
+    a single transaction"""
+    load_attributes = load.dict(exclude={"medications", "strategy", "priorities"})
     db_load = Load(**load_attributes, drone_id=drone_id, weight_loaded=weight_loaded)
     session.add(db_load)
-    await session.commit()
+    await session.flush()
 
     load_medication_values = [
-        {"load_id": db_load.id, "medication_id": medication.id}
+        {"load_id": db_load.id, "medication_id": medication["id"]}
         for medication in medications
     ]
     await session.execute(insert(load_medication).values(load_medication_values))
+    await session.execute(
+        update(Drone)
+        .where(Drone.id == drone_id)
+        .values(**state_machine.values(Status.LOADED))
+    )
     await session.commit()
-    await update_drone(session, drone_id, state=Status.LOADED)
+    await bump_table_versions(session, "drone", "load")
+    await shared_cache.invalidate(DRONES)
+    await drone_events.publish({drone_id: {"state": Status.LOADED}})
 
     return db_load
 
 
+async def dispatch_loads(
+    session: AsyncSession,
+    load: LoadBase,
+    assignments: list[tuple[Drone, list[dict]]],
+) -> list[Load]:
+    """
+    Create one load per drone, link its medications and mark the drones as
+    LOADED, everything in a single transaction
+    """
+    db_loads = [
+        Load(
+            **load.dict(include=set(LoadBase.__fields__)),
+            drone_id=drone.id,
+            weight_loaded=sum(medication["weight"] for medication in medications),
+        )
+        for drone, medications in assignments
+    ]
+    session.add_all(db_loads)
+    await session.flush()
+
+    load_medication_values = [
+        {"load_id": db_load.id, "medication_id": medication["id"]}
+        for db_load, (_, medications) in zip(db_loads, assignments)
+        for medication in medications
+    ]
+    await session.execute(insert(load_medication).values(load_medication_values))
+    await session.execute(
+        update(Drone)
+        .where(Drone.id.in_([drone.id for drone, _ in assignments]))
+        .values(**state_machine.values(Status.LOADED))
+    )
+    await session.commit()
+    await bump_table_versions(session, "drone", "load")
+    await shared_cache.invalidate(DRONES)
+    await drone_events.publish(
+        {drone.id: {"state": Status.LOADED} for drone, _ in assignments}
+    )
+
+    return db_loads
+
+
 async def update_drone(session: AsyncSession, drone_id: int, **kwarg):
     update_query = update(Drone).where(Drone.id == drone_id).values(kwarg)
     await session.execute(update_query)
     await session.commit()
+    await bump_table_versions(session, "drone")
+    await shared_cache.invalidate(DRONES)
+    await drone_events.publish({drone_id: kwarg})
 
 
-async def get_drone_loads(session: AsyncSession, drone_id: int):
-    query = select(Load).where(Load.drone_id == drone_id)
-    result = await session.scalars(query)
-    return result.all()
+async def change_drone_state(session: AsyncSession, drone: Drone, state: Status):
+    """Move a drone to `state`, raise InvalidTransition if it isn't allowed"""
+    check_transition(drone.state, state)
+    await update_drone(session, drone.id, **state_machine.values(state))
+
+
+async def advance_drone_states(machine: StateMachine | None = None):
+    """Move on every drone whose state is due"""
+    machine = machine or state_machine
+    async for session in get_async_session():
+        result = await session.execute(machine.advance())
+        rows = result.all()
+        await session.commit()
+        if rows:
+            await bump_table_versions(session, "drone")
+            await shared_cache.invalidate(DRONES)
+            await drone_events.publish(
+                {drone_id: {"state": state} for drone_id, _, state in rows}
+            )
+        return rows
+
+
+async def get_drone_loads(
+    session: AsyncSession, drone_id: int
+) -> list[tuple[Load, list[dict]]]:
+    """
+    Loads of a drone with the column values of their medications
+    - the loads come with their medication ids in one query, the medications
+    are read through the cache
+    """
+    query = (
+        select(Load, load_medication.c.medication_id)
+        .outerjoin(load_medication, load_medication.c.load_id == Load.id)
+        .where(Load.drone_id == drone_id)
+        .order_by(Load.id)
+    )
+    rows = (await session.execute(query)).all()
+    medications = await get_medications_by_ids(
+        session,
+        [medication_id for _, medication_id in rows if medication_id is not None],
+    )
+
+    loads: dict[int, tuple[Load, list[dict]]] = {}
+    for load, medication_id in rows:
+        _, load_medications = loads.setdefault(load.id, (load, []))
+        if medication_id in medications:
+            load_medications.append(medications[medication_id])
+    return list(loads.values())
 
 
 async def get_medication_by_load(session: AsyncSession, load_id: int):
-    query = select(load_medication.c.medication_id).where(
-        load_medication.c.load_id == load_id
+    query = (
+        select(Medication)
+        .join(load_medication, load_medication.c.medication_id == Medication.id)
+        .where(load_medication.c.load_id == load_id)
     )
     result = await session.scalars(query)
-    rows = result.all()
 
-    medications: list[Medication] = [
-        await get_medication_by_id(session, medication_id) for medication_id in rows
-    ]
-
-    return medications
+    return result.all()
 
 
 async def get_available_drones(session: AsyncSession) -> list[Drone]:
-    query = select(Drone).where(
-        Drone.state == Status.IDLE, Drone.battery_capacity >= 25
+    query = (
+        select(Drone)
+        .where(Drone.state == Status.IDLE, Drone.battery_capacity >= 25)
+        .order_by(Drone.id)
     )
     result = await session.scalars(query)
     return result.all()
 
 
-async def update_and_check_battery():
-    # subtract 1% of battery
+async def get_fleet_counts(
+    session: AsyncSession,
+) -> tuple[dict[Status, int], dict[int, int]]:
+    """Number of drones by state and by battery capacity"""
+    by_state = select(Drone.state, func.count()).group_by(Drone.state)
+    by_battery = select(Drone.battery_capacity, func.count()).group_by(
+        Drone.battery_capacity
+    )
+    return (
+        dict((await session.execute(by_state)).all()),
+        dict((await session.execute(by_battery)).all()),
+    )
+
+
+async def get_cached_available_drones(
+    session: AsyncSession, etag: str = ""
+) -> list[dict]:
+    """Available drones as JSON, from the shared cache"""
+
+    async def load() -> list[dict]:
+        drones = await get_available_drones(session)
+        return jsonable_encoder([DroneSchema.from_orm(drone) for drone in drones])
+
+    return await shared_cache.get_or_load(DRONES, f"{etag}:available", load)
+
+
+async def update_and_check_battery(
+    batch_size: int | None = None, simulation: BatterySimulation | None = None
+):
+    """
+    Apply a tick of the battery simulation, batch_size drones at a time
+    - the battery model is evaluated by a single UPDATE per id range, only
+    the drones whose capacity or carried fraction of a percent changes are
+    written, it returns their capacity before and after
+    - every id range is committed on its own and the loop is released
+    between batches
+    - one audit line per drone whose capacity changed, queued without a size
+    limit and written to battery.log off the event loop
+    """
+    battery_audit = get_logger("battery_check")
+    batch_size = batch_size or base_settings.battery_batch_size
+    simulation = simulation or battery_simulation
+    new_capacity, new_remainder = simulation.model.battery_change(
+        simulation.elapsed_minutes()
+    )
     async for session in get_async_session():
-        logger = get_logger("battery_check")
-        query = (
-            update(Drone)
-            .where(Drone.battery_capacity > 0)
-            .values(battery_capacity=Drone.battery_capacity - 1)
-            .returning(Drone)
-        )
-        result = await session.scalars(query)
-        await session.commit()
-        rows = result.all()
-        for row in rows:
-            logger.info(
-                f"Drone {row.serial_number}, battery capacity: {row.battery_capacity} %"
+        query = select(func.min(Drone.id), func.max(Drone.id))
+        first_id, last_id = (await session.execute(query)).one()
+        if first_id is None:
+            return
+        changed = False
+        for start in range(first_id, last_id + 1, batch_size):
+            battery = (
+                select(
+                    Drone.id,
+                    Drone.battery_capacity.label("before"),
+                    new_capacity.label("capacity"),
+                    new_remainder.label("remainder"),
+                )
+                .where(
+                    Drone.id.between(start, start + batch_size - 1),
+                    or_(
+                        Drone.battery_capacity != new_capacity,
+                        Drone.battery_remainder != new_remainder,
+                    ),
+                )
+                .subquery()
+            )
+            # on the table, the ORM doesn't return columns of another FROM
+            query = (
+                update(Drone.__table__)
+                .where(Drone.id == battery.c.id)
+                .values(
+                    battery_capacity=battery.c.capacity,
+                    battery_remainder=battery.c.remainder,
+                )
+                .returning(
+                    Drone.id,
+                    Drone.serial_number,
+                    Drone.battery_capacity,
+                    battery.c.before,
+                )
+            )
+            result = await session.execute(query)
+            # the drones whose capacity didn't move only carried a fraction
+            rows = [row[:3] for row in result if row.battery_capacity != row.before]
+            await session.commit()
+            if rows:
+                await bump_table_versions(session, "drone")
+            changed = changed or bool(rows)
+            for _, serial_number, battery_capacity in rows:
+                battery_audit.info(
+                    "Drone %s, battery capacity: %s %%", serial_number, battery_capacity
+                )
+            await drone_events.publish(
+                {
+                    drone_id: {"battery_capacity": battery}
+                    for drone_id, _, battery in rows
+                }
             )
+            await asyncio.sleep(0)
+        if changed:
+            await shared_cache.invalidate(DRONES)
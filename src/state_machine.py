@@ -0,0 +1,98 @@
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, Update, case, literal, update
+from src.clock import Clock, SystemClock
+from src.config.base_config import base_settings
+from src.models.drone import Drone, Status
+
+# legal moves from every state
+TRANSITIONS: dict[Status, frozenset[Status]] = {
+    Status.IDLE: frozenset({Status.LOADING}),
+    Status.LOADING: frozenset({Status.LOADED, Status.IDLE}),
+    Status.LOADED: frozenset({Status.DELIVERING}),
+    Status.DELIVERING: frozenset({Status.DELIVERED}),
+    Status.DELIVERED: frozenset({Status.RETURNING}),
+    Status.RETURNING: frozenset({Status.IDLE}),
+}
+
+# moves done by the scheduler once the state's duration is over
+SCHEDULE: dict[Status, Status] = {
+    Status.LOADED: Status.DELIVERING,
+    Status.DELIVERING: Status.DELIVERED,
+    Status.DELIVERED: Status.RETURNING,
+    Status.RETURNING: Status.IDLE,
+}
+
+
+class InvalidTransition(ValueError):
+    def __init__(self, source: Status, target: Status):
+        self.source = source
+        self.target = target
+        super().__init__(
+            f"The drone can't go from {source.value} to {target.value} state"
+        )
+
+
+def check_transition(source: Status, target: Status) -> None:
+    if target not in TRANSITIONS[source]:
+        raise InvalidTransition(source, target)
+
+
+class StateMachine:
+    """
+    Schedule the time based progression of the drones' state
+    - entering a state in SCHEDULE sets Drone.state_due_at, the other states
+    clear it
+    - a tick only touches the drones whose state_due_at has passed, found
+    through the state_due_at index
+    """
+
+    def __init__(
+        self, durations: Mapping[Status, timedelta], clock: Clock | None = None
+    ):
+        self.durations = durations
+        self.clock = clock or SystemClock()
+
+    def due_at(self, state: Status, since: datetime | None = None) -> datetime | None:
+        if state not in SCHEDULE:
+            return None
+        return (since or self.clock.now()) + self.durations[state]
+
+    def values(self, state: Status) -> dict:
+        """Column values to enter `state` now"""
+        return {"state": state, "state_due_at": self.due_at(state)}
+
+    def advance(self) -> Update:
+        """UPDATE moving every drone whose state is due to the next one"""
+        now = self.clock.now()
+        next_state = case(
+            *[
+                (Drone.state == source, literal(target, Drone.state.type))
+                for source, target in SCHEDULE.items()
+            ],
+        )
+        next_due_at = case(
+            *[
+                (Drone.state == source, literal(self.due_at(target, now), DateTime))
+                for source, target in SCHEDULE.items()
+                if target in SCHEDULE
+            ],
+            else_=None,
+        )
+        return (
+            update(Drone)
+            .where(Drone.state_due_at <= now, Drone.state.in_(SCHEDULE))
+            .values(state=next_state, state_due_at=next_due_at)
+            .returning(Drone.id, Drone.serial_number, Drone.state)
+            .execution_options(synchronize_session=False)
+        )
+
+
+state_machine = StateMachine(
+    {
+        Status.LOADED: timedelta(seconds=base_settings.loaded_duration),
+        Status.DELIVERING: timedelta(seconds=base_settings.delivering_duration),
+        Status.DELIVERED: timedelta(seconds=base_settings.delivered_duration),
+        Status.RETURNING: timedelta(seconds=base_settings.returning_duration),
+    }
+)
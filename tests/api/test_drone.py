@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 from httpx import AsyncClient
 import pytest
@@ -5,17 +6,21 @@ from fastapi import status
 from src.schemas.load import LoadCreate
 from src.dependencies import drone_can_carry_load
 from src.schemas.drone import DroneCreate
-from src.models.drone import Models, Status
+from src.models.drone import Drone as DroneModel, Models, Status
 from src.services import (
     create_drone,
     get_available_drones,
+    get_drone_by_id,
+    get_drone_loads,
     get_drones,
     get_medications,
     load_drone,
     update_drone,
 )
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from tests.utils.utils import generate_random_alphanum, random_number
+from src.config.database import async_engine
+from tests.utils.utils import QueryCounter, generate_random_alphanum, random_number
 from tests.utils.seed_db import seed_db
 
 
@@ -40,6 +45,81 @@ async def test_create_drone(client: AsyncClient) -> None:
     assert resp_json["battery_capacity"] == data["battery_capacity"]
 
 
+@pytest.mark.asyncio
+async def test_import_drones(client: AsyncClient, session: AsyncSession) -> None:
+    await seed_db()
+    [taken] = (await session.execute(select(DroneModel.serial_number).limit(1))).one()
+    serials = [generate_random_alphanum(12) for _ in range(5)]
+    rows = [
+        {"serial_number": serial, "model": "LIGHTWEIGHT", "state": "IDLE"}
+        for serial in serials
+    ]
+    rows[1]["weight_limit"] = 600
+    rows[3]["serial_number"] = serials[0]
+    rows.append({"serial_number": taken, "model": "LIGHTWEIGHT", "state": "IDLE"})
+    rows.append("not a drone")
+
+    with QueryCounter(async_engine) as counter:
+        resp = await client.post("/drones/bulk/", json=rows)
+    resp_json = resp.json()
+    assert resp.status_code == status.HTTP_200_OK
+    assert (resp_json["accepted"], resp_json["rejected"]) == (3, 4)
+    assert [row["status"] for row in resp_json["rows"]] == [
+        "accepted",
+        "rejected",
+        "accepted",
+        "rejected",
+        "accepted",
+        "rejected",
+        "rejected",
+    ]
+    assert resp_json["rows"][1]["errors"][0].startswith("weight_limit:")
+    assert "row 1" in resp_json["rows"][3]["errors"][0]
+    assert resp_json["rows"][5]["errors"] == ["serial_number already registered"]
+    # serial numbers taken, insert and table version, however many rows
+    assert counter.count == 3
+
+    drone = await get_drone_by_id(session, resp_json["rows"][4]["id"])
+    assert drone.serial_number == serials[4]
+    assert drone.weight_limit == 500
+    resp = await client.get("/drones/available/")
+    assert len(resp.json()) == 6
+
+
+@pytest.mark.asyncio
+async def test_import_drones_csv(client: AsyncClient, session: AsyncSession) -> None:
+    lines = ["serial_number,model,weight_limit,battery_capacity,state"]
+    lines += [f"CSV{i},MIDDLEWEIGHT,{i},,IDLE" for i in range(1, 1201)]
+    body = "\r\n".join(lines).encode()
+
+    async def stream():
+        for start in range(0, len(body), 1000):
+            yield body[start : start + 1000]
+
+    resp = await client.post(
+        "/drones/bulk/", content=stream(), headers={"Content-Type": "text/csv"}
+    )
+    resp_json = resp.json()
+    assert resp.status_code == status.HTTP_200_OK
+    assert (resp_json["accepted"], resp_json["rejected"]) == (500, 700)
+    assert resp_json["rows"][499] == {
+        "row": 500,
+        "status": "accepted",
+        "id": 500,
+        "errors": [],
+    }
+    drones = await get_drones(session, limit=1000)
+    assert [d.serial_number for d in drones] == [f"CSV{i}" for i in range(1, 501)]
+    assert {d.battery_capacity for d in drones} == {100}
+
+    resp = await client.post(
+        "/drones/bulk/", content=b"<drones/>", headers={"Content-Type": "text/xml"}
+    )
+    assert resp.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    resp = await client.post("/drones/bulk/", json={"serial_number": "CSV1"})
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+
 @pytest.mark.asyncio
 async def test_get_drone(client: AsyncClient, session: AsyncSession) -> None:
     drone = DroneCreate(
@@ -129,6 +209,47 @@ async def test_get_available_drones(client: AsyncClient, session: AsyncSession)
     assert len(resp_json) == 3
 
 
+@pytest.mark.asyncio
+async def test_get_available_drones_is_cached(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    resp = await client.get("/drones/available/")
+    assert len(resp.json()) == 3
+
+    with QueryCounter(async_engine) as counter:
+        resp = await client.get("/drones/available/")
+    # only the table versions of the ETag
+    assert counter.count == 1
+    assert len(resp.json()) == 3
+
+    drone = (await get_available_drones(session))[0]
+    await update_drone(session, drone.id, state=Status.LOADING)
+    resp = await client.get("/drones/available/")
+    assert drone.id not in [d["id"] for d in resp.json()]
+
+
+@pytest.mark.asyncio
+async def test_list_drones_etag(client: AsyncClient, session: AsyncSession) -> None:
+    await seed_db()
+    resp = await client.get("/drones/")
+    etag = resp.headers["etag"]
+
+    for url in ("/drones/", "/drones/?state=IDLE", "/drones/1"):
+        resp = await client.get(url, headers={"If-None-Match": etag})
+        assert resp.status_code == status.HTTP_304_NOT_MODIFIED
+        assert resp.headers["etag"] == etag
+        assert resp.content == b""
+
+    await update_drone(session, 1, state=Status.LOADING)
+    resp = await client.get("/drones/", headers={"If-None-Match": etag})
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.headers["etag"] != etag
+    resp = await client.get("/drones/available/", headers={"If-None-Match": etag})
+    assert resp.status_code == status.HTTP_200_OK
+    assert 1 not in [drone["id"] for drone in resp.json()]
+
+
 @pytest.mark.asyncio
 async def test_loading_drone(client: AsyncClient, session: AsyncSession) -> None:
     await seed_db()
@@ -155,6 +276,37 @@ async def test_loading_drone(client: AsyncClient, session: AsyncSession) -> None
     assert len(contect["load"]["medications"]) == len(medications)
 
 
+@pytest.mark.asyncio
+async def test_loading_drone_with_knapsack_strategy(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    drone = DroneCreate(
+        serial_number=generate_random_alphanum(10),
+        model=Models.LIGHTWEIGHT,
+        weight_limit=150,
+        battery_capacity=100,
+        state=Status.IDLE,
+    )
+    drone_db = await create_drone(session, drone)
+    medications = sorted(await get_medications(session), key=lambda x: x.id)
+
+    data = {
+        "origin": "La habana",
+        "destination": "Playa",
+        "create": str(datetime.datetime.now()),
+        "medications": [m.id for m in medications],
+        "strategy": "KNAPSACK",
+    }
+    resp = await client.post(f"/drones/{drone_db.id}/loading/", json=data)
+    contect = resp.json()
+    assert resp.status_code == status.HTTP_200_OK
+    assert contect["strategy"] == "KNAPSACK"
+    # first fit would stop at 50 + 20 + 30 + 15 = 115
+    assert contect["load"]["weight_loaded"] == 150
+    assert contect["utilisation"] == 1.0
+
+
 @pytest.mark.asyncio
 async def test_loading_drone_with_overweight(
     client: AsyncClient, session: AsyncSession
@@ -184,6 +336,74 @@ async def test_loading_drone_with_overweight(
     assert contect["detail"] == "Neither medication could be loaded."
 
 
+@pytest.mark.asyncio
+async def test_rejected_loading_keeps_medication_cache(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    # drone 3 carries 35, medication 1 weights 50
+    data = {
+        "origin": "La habana",
+        "destination": "Playa",
+        "create": str(datetime.datetime.now()),
+        "medications": [1],
+    }
+    resp = await client.post("/drones/3/loading/", json=data)
+    assert resp.status_code == status.HTTP_406_NOT_ACCEPTABLE
+
+    # the rollback of the rejected request must not reach the cached medication
+    resp = await client.get("/medications/1")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["weight"] == 50
+    resp = await client.post("/drones/1/loading/", json=data)
+    assert resp.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_dispatch_order(client: AsyncClient, session: AsyncSession) -> None:
+    await seed_db()
+    medications = await get_medications(session)
+    medication_ids = [m.id for m in medications]
+
+    data = {
+        "origin": "La habana",
+        "destination": "Playa",
+        "create": str(datetime.datetime.now()),
+        "medications": medication_ids * 2 + [999],
+    }
+    resp = await client.post("/drones/dispatch/", json=data)
+    contect = resp.json()
+    assert resp.status_code == status.HTTP_200_OK
+    assert contect["unassigned"] == [999]
+    # the same medication can't travel twice in one load
+    assert len(contect["loads"]) == 2
+    for drone_loading in contect["loads"]:
+        assert drone_loading["state"] == Status.LOADED.value
+        assert drone_loading["strategy"] == "FIRST_FIT_DECREASING"
+        assert sorted(m["id"] for m in drone_loading["load"]["medications"]) == sorted(
+            medication_ids
+        )
+
+    session.expunge_all()
+    assert len(await get_available_drones(session)) == 1
+
+
+@pytest.mark.asyncio
+async def test_dispatch_order_without_capacity(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    data = {
+        "origin": "La habana",
+        "destination": "Playa",
+        "create": str(datetime.datetime.now()),
+        "medications": [999],
+    }
+    resp = await client.post("/drones/dispatch/", json=data)
+    assert resp.status_code == status.HTTP_406_NOT_ACCEPTABLE
+    assert resp.json()["detail"] == "Neither medication could be loaded."
+
+
 @pytest.mark.asyncio
 async def test_checking_loaded_medication(
     client: AsyncClient, session: AsyncSession
@@ -235,3 +455,140 @@ async def test_checking_loaded_medication(
     assert resp.status_code == status.HTTP_200_OK
     assert contect["id"] == drone.id
     assert len(contect["loads"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_loaded_medication_query_count(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    drone = (await get_available_drones(session))[0]
+    medications = await get_medications(session)
+    medication_values = [m.column_values() for m in medications]
+
+    async def add_loads(count: int) -> None:
+        for _ in range(count):
+            load = LoadCreate(medications=[m.id for m in medications])
+            await load_drone(session, drone.id, load, medication_values, 0)
+
+    async def count_queries() -> int:
+        with QueryCounter(async_engine) as counter:
+            resp = await client.get(f"/drones/{drone.id}/loaded/")
+        assert resp.status_code == status.HTTP_200_OK
+        return counter.count, len(resp.json()["loads"])
+
+    await add_loads(1)
+    queries_one_load, loads = await count_queries()
+    assert loads == 1
+
+    await add_loads(10)
+    queries_many_loads, loads = await count_queries()
+    assert loads == 11
+    # drone, loads with their medication ids and the medications, which are
+    # cached after the first request
+    assert queries_one_load == 3
+    assert queries_many_loads == 2
+
+
+@pytest.mark.asyncio
+async def test_list_drones_pagination(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    for i in range(5):
+        drone = DroneCreate(
+            serial_number=generate_random_alphanum(10 + i),
+            model=Models.LIGHTWEIGHT,
+            weight_limit=random_number(500),
+            battery_capacity=random_number(),
+            state=Status.IDLE,
+        )
+        await create_drone(session, drone)
+
+    ids = []
+    params = {"limit": 2}
+    while True:
+        resp = await client.get("/drones/", params=params)
+        assert resp.status_code == status.HTTP_200_OK
+        assert len(resp.json()) <= 2
+        ids += [drone["id"] for drone in resp.json()]
+        if "X-Next-Cursor" not in resp.headers:
+            break
+        params["cursor"] = resp.headers["X-Next-Cursor"]
+
+    assert ids == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_list_drones_filters(client: AsyncClient, session: AsyncSession) -> None:
+    drones = [
+        (Models.LIGHTWEIGHT, Status.IDLE, 90),
+        (Models.LIGHTWEIGHT, Status.LOADED, 40),
+        (Models.HEAVYWEIGHT, Status.IDLE, 20),
+    ]
+    for i, (model, state, battery) in enumerate(drones):
+        drone = DroneCreate(
+            serial_number=generate_random_alphanum(10 + i),
+            model=model,
+            battery_capacity=battery,
+            state=state,
+        )
+        await create_drone(session, drone)
+
+    async def list_ids(**params) -> list[int]:
+        resp = await client.get("/drones/", params=params)
+        assert resp.status_code == status.HTTP_200_OK
+        return [drone["id"] for drone in resp.json()]
+
+    assert await list_ids(state="IDLE") == [1, 3]
+    assert await list_ids(model="LIGHTWEIGHT") == [1, 2]
+    assert await list_ids(battery_min=30, battery_max=50) == [2]
+    assert await list_ids(state="IDLE", model="HEAVYWEIGHT", battery_max=20) == [3]
+
+
+@pytest.mark.asyncio
+async def test_change_drone_state(client: AsyncClient, session: AsyncSession) -> None:
+    drone = DroneCreate(
+        serial_number=generate_random_alphanum(10),
+        model=Models.LIGHTWEIGHT,
+        state=Status.RETURNING,
+    )
+    drone_db = await create_drone(session, drone)
+
+    resp = await client.patch(f"/drones/{drone_db.id}/state/", json={"state": "LOADED"})
+    assert resp.status_code == status.HTTP_409_CONFLICT
+    assert resp.json()["detail"] == "The drone can't go from RETURNING to LOADED state"
+
+    resp = await client.patch(f"/drones/{drone_db.id}/state/", json={"state": "IDLE"})
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["state"] == Status.IDLE.value
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loading(client: AsyncClient, session: AsyncSession) -> None:
+    await seed_db()
+    drones = await get_available_drones(session)
+    medications = await get_medications(session)
+    lightest = min(medications, key=lambda x: x.weight)
+    data = {
+        "origin": "La habana",
+        "destination": "Playa",
+        "create": str(datetime.datetime.now()),
+        "medications": [lightest.id],
+    }
+
+    responses = await asyncio.gather(
+        *[
+            client.post(f"/drones/{drones[i % len(drones)].id}/loading/", json=data)
+            for i in range(300)
+        ]
+    )
+
+    status_codes = [resp.status_code for resp in responses]
+    assert status_codes.count(status.HTTP_200_OK) == len(drones)
+    assert set(status_codes) <= {
+        status.HTTP_200_OK,
+        status.HTTP_405_METHOD_NOT_ALLOWED,
+        status.HTTP_409_CONFLICT,
+    }
+    for drone in drones:
+        assert len(await get_drone_loads(session, drone.id)) == 1
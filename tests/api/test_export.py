@@ -0,0 +1,58 @@
+import datetime
+import gzip
+import json
+from httpx import AsyncClient
+import pytest
+from fastapi import status
+from src.models.drone import Status
+from src.schemas.load import LoadCreate
+from src.services import get_available_drones, get_medications, load_drone
+from sqlalchemy.ext.asyncio import AsyncSession
+from tests.utils.seed_db import seed_db
+
+
+@pytest.mark.asyncio
+async def test_export_drones(client: AsyncClient) -> None:
+    await seed_db()
+    resp = await client.get("/export/drones/")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.headers["content-type"] == "application/x-ndjson"
+
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [row["id"] for row in rows] == [1, 2, 3, 4, 5]
+    assert {row["state"] for row in rows} == {Status.IDLE.value, Status.LOADED.value}
+
+
+@pytest.mark.asyncio
+async def test_export_load_history_gzip(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    drone = (await get_available_drones(session))[0]
+    medications = await get_medications(session)
+    load = LoadCreate(
+        create=str(datetime.datetime.now()), medications=[m.id for m in medications]
+    )
+    medication_values = [m.column_values() for m in medications]
+    await load_drone(session, drone.id, load, medication_values, 0)
+
+    resp = await client.get("/export/loads/", params={"gzip": True})
+    assert resp.headers["content-encoding"] == "gzip"
+    [row] = [json.loads(line) for line in resp.text.splitlines()]
+    assert row["drone_id"] == drone.id
+    datetime.datetime.fromisoformat(row["create"])
+
+    async with client.stream(
+        "GET", "/export/load_medications/", params={"gzip": True}
+    ) as resp:
+        body = gzip.decompress(b"".join([chunk async for chunk in resp.aiter_raw()]))
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert sorted(row["medication_id"] for row in rows) == sorted(
+        m.id for m in medications
+    )
+
+
+@pytest.mark.asyncio
+async def test_export_unknown_table(client: AsyncClient) -> None:
+    resp = await client.get("/export/users/")
+    assert resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
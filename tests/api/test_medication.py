@@ -1,12 +1,18 @@
 import os
+import stat
 import aiofiles
 from httpx import AsyncClient
 import pytest
 from fastapi import status
-from src.config.files import BASEDIR
+from src.config.base_config import base_settings
+from src.config.files import BASEDIR, IMG_DIR
+from src.images import FILE_MODE
+from src.models.image_blob import ImageBlob
 from src.schemas.medication import MedicationCreate
 from src.services import create_medication, get_medications
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from tests.utils.seed_db import seed_db
 from tests.utils.utils import (
     generate_random_alphanum,
     random_number,
@@ -94,3 +100,248 @@ async def test_get_list_medications(client: AsyncClient, session: AsyncSession)
     resp_json = resp.json()
     assert resp.status_code == status.HTTP_200_OK
     assert len(resp_json) == len(medications)
+
+
+@pytest.mark.asyncio
+async def test_list_medications_code_prefix(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    for code in ["AB_1", "AB_2", "CD_1"]:
+        medication = MedicationCreate(
+            name=generate_random_alphanum(10), weight=random_number(100), code=code
+        )
+        await create_medication(session, medication)
+
+    resp = await client.get("/medications/", params={"code_prefix": "AB_", "limit": 1})
+    assert resp.status_code == status.HTTP_200_OK
+    assert [m["code"] for m in resp.json()] == ["AB_1"]
+
+    resp = await client.get(
+        "/medications/",
+        params={"code_prefix": "AB_", "cursor": resp.headers["X-Next-Cursor"]},
+    )
+    assert [m["code"] for m in resp.json()] == ["AB_2"]
+    assert "X-Next-Cursor" not in resp.headers
+
+
+async def read_test_image() -> bytes:
+    async with aiofiles.open(
+        os.path.join(BASEDIR, "tests/api/images/Aspirin.jpeg"), mode="rb"
+    ) as f:
+        return await f.read()
+
+
+@pytest.mark.asyncio
+async def test_create_medication_image_is_published(client: AsyncClient) -> None:
+    data = {
+        "name": generate_random_alphanum(15),
+        "weight": random_number(50),
+        "code": random_upper_string(5),
+    }
+    resp = await client.post(
+        "/medications/",
+        data=data,
+        files={"image": ("filename.png", await read_test_image(), "image/png")},
+    )
+    resp_json = resp.json()
+    assert resp.status_code == status.HTTP_200_OK
+    # the format comes from the content, not from the client
+    assert resp_json["image"].endswith(".jpeg")
+    assert os.path.isfile(resp_json["image"])
+    assert not [f for f in os.listdir(IMG_DIR) if f.startswith(".upload-")]
+
+    # the variants are generated once the response is sent
+    resp = await client.get("/medications/", params={"variant": "thumbnail"})
+    [medication] = resp.json()
+    assert medication["image"].endswith("_thumbnail.webp")
+    assert os.path.isfile(medication["image"])
+    # the upload is not left owner-only, it's served like the variants
+    image_mode = stat.S_IMODE(os.stat(resp_json["image"]).st_mode)
+    assert image_mode == stat.S_IMODE(os.stat(medication["image"]).st_mode)
+    assert image_mode == FILE_MODE
+
+
+@pytest.mark.asyncio
+async def test_create_medication_with_fake_image(client: AsyncClient) -> None:
+    data = {
+        "name": generate_random_alphanum(15),
+        "weight": random_number(50),
+        "code": random_upper_string(5),
+    }
+    resp = await client.post(
+        "/medications/",
+        data=data,
+        files={"image": ("filename.png", b"<svg></svg>", "image/png")},
+    )
+    assert resp.status_code == status.HTTP_406_NOT_ACCEPTABLE
+    assert resp.json()["detail"] == "Only .jpeg or .png files allowed"
+
+
+@pytest.mark.asyncio
+async def test_create_medication_with_large_image(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(base_settings, "max_image_size", 1024)
+    images_before = set(os.listdir(IMG_DIR))
+    data = {
+        "name": generate_random_alphanum(15),
+        "weight": random_number(50),
+        "code": random_upper_string(5),
+    }
+    resp = await client.post(
+        "/medications/",
+        data=data,
+        files={"image": ("filename.jpeg", await read_test_image(), "image/jpeg")},
+    )
+    assert resp.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert set(os.listdir(IMG_DIR)) == images_before
+
+
+@pytest.mark.asyncio
+async def test_create_medication_failed_insert_leaves_no_file(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    medication = MedicationCreate(
+        name=generate_random_alphanum(10),
+        weight=random_number(100),
+        code=random_upper_string(10),
+    )
+    await create_medication(session, medication)
+    images_before = set(os.listdir(IMG_DIR))
+
+    data = {"name": medication.name, "weight": 10, "code": medication.code}
+    resp = await client.post(
+        "/medications/",
+        data=data,
+        files={"image": ("filename.jpeg", await read_test_image(), "image/jpeg")},
+    )
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+    assert set(os.listdir(IMG_DIR)) == images_before
+
+
+@pytest.mark.asyncio
+async def test_create_medication_same_image_is_stored_once(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    image = await read_test_image()
+    filenames = []
+    inodes = []
+    for _ in range(2):
+        data = {
+            "name": generate_random_alphanum(15),
+            "weight": random_number(50),
+            "code": random_upper_string(5),
+        }
+        resp = await client.post(
+            "/medications/",
+            data=data,
+            files={"image": ("filename.jpeg", image, "image/jpeg")},
+        )
+        assert resp.status_code == status.HTTP_200_OK
+        filenames.append(os.path.basename(resp.json()["image"]))
+        inodes.append(os.stat(resp.json()["image"]).st_ino)
+
+    assert filenames[0] == filenames[1]
+    # the second upload was discarded, not published over the first one
+    assert inodes[0] == inodes[1]
+    assert not [f for f in os.listdir(IMG_DIR) if f.startswith(".upload-")]
+    [blob] = (await session.scalars(select(ImageBlob))).all()
+    assert blob.filename == filenames[0]
+    assert blob.ref_count == 2
+    assert blob.size == len(image)
+
+
+@pytest.mark.asyncio
+async def test_get_medication_image_is_cached(client: AsyncClient) -> None:
+    data = {
+        "name": generate_random_alphanum(15),
+        "weight": random_number(50),
+        "code": random_upper_string(5),
+    }
+    resp = await client.post(
+        "/medications/",
+        data=data,
+        files={"image": ("filename.jpeg", await read_test_image(), "image/jpeg")},
+    )
+    resp = await client.get(resp.json()["image"])
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+    # not named by its content, it may be replaced
+    path = os.path.join(IMG_DIR, f"{generate_random_alphanum(10)}.jpeg")
+    async with aiofiles.open(path, "wb") as f:
+        await f.write(await read_test_image())
+    try:
+        resp = await client.get(path)
+    finally:
+        os.remove(path)
+    assert resp.status_code == status.HTTP_200_OK
+    assert "cache-control" not in resp.headers
+
+
+@pytest.mark.asyncio
+async def test_get_medication_image_base_url(
+    client: AsyncClient, session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(base_settings, "image_base_url", "https://cdn.example.com/")
+    medication = MedicationCreate(
+        name=generate_random_alphanum(10),
+        weight=random_number(100),
+        code=random_upper_string(10),
+    )
+    db_medication = await create_medication(session, medication, "aspirin.jpeg")
+
+    for _ in range(2):
+        resp = await client.get(f"/medications/{db_medication.id}")
+        assert resp.json()["image"] == "https://cdn.example.com/aspirin.jpeg"
+        resp = await client.get("/medications/")
+        assert resp.json()[0]["image"] == "https://cdn.example.com/aspirin.jpeg"
+
+    await session.refresh(db_medication)
+    assert db_medication.image == "aspirin.jpeg"
+
+
+@pytest.mark.asyncio
+async def test_list_medications_etag(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    resp = await client.get("/medications/")
+    etag = resp.headers["etag"]
+    resp = await client.get("/medications/", headers={"If-None-Match": f"W/{etag}"})
+    assert resp.status_code == status.HTTP_304_NOT_MODIFIED
+
+    medication = MedicationCreate(
+        name=generate_random_alphanum(10), weight=10, code=random_upper_string(12)
+    )
+    await create_medication(session, medication)
+    resp = await client.get("/medications/", headers={"If-None-Match": etag})
+    assert resp.status_code == status.HTTP_200_OK
+    assert len(resp.json()) == 6
+
+
+@pytest.mark.asyncio
+async def test_import_medications_csv(
+    client: AsyncClient, session: AsyncSession
+) -> None:
+    await seed_db()
+    [taken] = await get_medications(session, limit=1)
+    body = (
+        "name,weight,code\n"
+        "Aspirin,10,ASPIRIN_500\n"
+        f"Other,10,{taken.code}\n"
+        "bad name,0,lower\n"
+        "Ibuprofen,20, IBU_200 \n"
+    )
+
+    resp = await client.post(
+        "/medications/bulk/", content=body, headers={"Content-Type": "text/csv"}
+    )
+    resp_json = resp.json()
+    assert resp.status_code == status.HTTP_200_OK
+    assert (resp_json["accepted"], resp_json["rejected"]) == (2, 2)
+    assert resp_json["rows"][1]["errors"] == ["code already registered"]
+    assert len(resp_json["rows"][2]["errors"]) == 3
+
+    resp = await client.get("/medications/", params={"code_prefix": "IBU"})
+    assert [m["id"] for m in resp.json()] == [resp_json["rows"][3]["id"]]
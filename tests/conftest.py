@@ -8,6 +8,13 @@ from src.config.database import custom_metadata, async_engine
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 
+from src.cache import (
+    DRONES,
+    MEDICATIONS,
+    medications_by_code,
+    medications_by_id,
+    shared_cache,
+)
 from src.main import app
 
 
@@ -23,6 +30,15 @@ def event_loop() -> Generator[asyncio.AbstractEventLoop, None, None]:
     loop.close()
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def clear_caches() -> AsyncGenerator[None, None]:
+    # the tables are dropped after every test and the ids start over
+    yield
+    medications_by_id.clear()
+    medications_by_code.clear()
+    await shared_cache.invalidate(DRONES, MEDICATIONS)
+
+
 @pytest_asyncio.fixture(scope="function")
 async def client() -> AsyncGenerator[AsyncClient, None]:
     async with AsyncClient(app=app, base_url="http://") as client:
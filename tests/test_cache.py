@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.cache import AsyncLRUCache
+from src.config.database import async_engine
+from src.schemas.medication import MedicationCreate
+from src.services import (
+    create_medication,
+    get_medication_by_code,
+    get_medications_by_ids,
+)
+from tests.utils.seed_db import seed_db
+from tests.utils.utils import QueryCounter, generate_random_alphanum
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def loader(value, calls: list):
+    async def load():
+        calls.append(value)
+        await asyncio.sleep(0)
+        return value
+
+    return load
+
+
+@pytest.mark.asyncio
+async def test_cache_lru_and_ttl() -> None:
+    clock = FakeClock()
+    cache = AsyncLRUCache(maxsize=2, ttl=10, clock=clock)
+    calls = []
+
+    for key in ("a", "b", "a", "c"):
+        assert await cache.get_or_load(key, loader(key, calls)) == key
+    # "b" was the least recently used
+    assert calls == ["a", "b", "c"]
+    assert await cache.get_or_load("b", loader("b", calls)) == "b"
+    assert calls == ["a", "b", "c", "b"]
+
+    clock.now = 10
+    assert await cache.get_or_load("b", loader("b", calls)) == "b"
+    assert calls == ["a", "b", "c", "b", "b"]
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 5, 2)
+
+
+@pytest.mark.asyncio
+async def test_cache_concurrent_misses_load_once() -> None:
+    cache = AsyncLRUCache(maxsize=10, ttl=10)
+    calls = []
+
+    values = await asyncio.gather(
+        *[cache.get_or_load(1, loader("one", calls)) for _ in range(10)],
+        cache.get_many([1, 2], lambda keys: asyncio.sleep(0, {2: "two"})),
+    )
+
+    assert values == ["one"] * 10 + [{1: "one", 2: "two"}]
+    assert calls == ["one"]
+    assert await cache.get_many([1, 2, 3], lambda keys: asyncio.sleep(0, {})) == {
+        1: "one",
+        2: "two",
+    }
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidated_while_loading() -> None:
+    cache = AsyncLRUCache(maxsize=10, ttl=10)
+    calls = []
+
+    async def load():
+        cache.invalidate(1)
+        return "stale"
+
+    assert await cache.get_or_load(1, load) == "stale"
+    assert await cache.get_or_load(1, loader("fresh", calls)) == "fresh"
+    assert await cache.get_or_load(1, loader("other", calls)) == "fresh"
+
+    async def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        await cache.get_or_load(2, fail)
+    assert await cache.get_or_load(2, loader("two", calls)) == "two"
+
+
+@pytest.mark.asyncio
+async def test_medication_cache(session: AsyncSession) -> None:
+    await seed_db()
+    medication_ids = [1, 2, 3]
+    with QueryCounter(async_engine) as counter:
+        await get_medications_by_ids(session, medication_ids)
+        medications = await get_medications_by_ids(session, medication_ids)
+    assert counter.count == 1
+    assert sorted(medications) == medication_ids
+
+    medication = MedicationCreate(
+        name=generate_random_alphanum(10), weight=10, code="NEW_CODE"
+    )
+    assert await get_medication_by_code(session, "NEW_CODE") is None
+    db_medication = await create_medication(session, medication)
+    assert (await get_medication_by_code(session, "NEW_CODE"))["id"] == db_medication.id
@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from collections.abc import AsyncGenerator
+from src.cache import AsyncLRUCache, SharedCache
+from src.cache_backends import MemoryBackend, RedisBackend
+from tests.utils.resp_server import RespServer
+
+
+@pytest_asyncio.fixture
+async def resp_server() -> AsyncGenerator[RespServer, None]:
+    server = await RespServer().start()
+    yield server
+    await server.close()
+
+
+async def next_message(messages) -> bytes:
+    return await asyncio.wait_for(messages.__anext__(), timeout=1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("network", [False, True])
+async def test_backend(network: bool, resp_server: RespServer) -> None:
+    backend = RedisBackend(resp_server.url) if network else MemoryBackend()
+
+    assert await backend.get("key") is None
+    await backend.set("key", b"value", ttl=60)
+    assert await backend.get("key") == b"value"
+    assert await backend.incr("counter") == 1
+    assert await backend.incr("counter") == 2
+
+    messages = backend.subscribe("channel")
+    received = asyncio.ensure_future(next_message(messages))
+    while not received.done():
+        await backend.publish("channel", b"hello")
+        await asyncio.sleep(0.01)
+    assert received.result() == b"hello"
+
+    await messages.aclose()
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_is_bounded() -> None:
+    now = [0.0]
+    backend = MemoryBackend(maxsize=3, clock=lambda: now[0])
+    assert await backend.incr("drones:version") == 1
+    for i in range(3):
+        await backend.set(f"drones:1:{i}", b"page", ttl=60)
+    # read, so the oldest one left is drones:1:1
+    assert await backend.get("drones:1:0") == b"page"
+
+    # keys of the new version or of new query strings push the old ones out
+    for i in range(100):
+        await backend.set(f"drones:2:{i}", b"page", ttl=60)
+    assert len(backend) == 3
+    assert await backend.get("drones:1:0") is None
+    assert await backend.get("drones:version") == b"1"
+    assert await backend.incr("drones:version") == 2
+
+    now[0] = 61
+    assert await backend.get("drones:2:99") is None
+    assert len(backend) == 2
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_across_workers(resp_server: RespServer) -> None:
+    """Two workers sharing a server, a write in one is seen by the other"""
+    local = AsyncLRUCache(maxsize=10, ttl=60)
+    workers = [SharedCache(RedisBackend(resp_server.url), ttl=60) for _ in range(2)]
+    workers[0].on_invalidate("drones", local.clear)
+    await workers[0].start()
+    loads = []
+
+    async def load(value):
+        loads.append(value)
+        return value
+
+    assert await workers[0].get_or_load("drones", "available", lambda: load([1])) == [1]
+    assert await workers[1].get_or_load("drones", "available", lambda: load([2])) == [1]
+    await local.get_or_load("drone", lambda: load("cached"))
+    assert loads == [[1], "cached"]
+
+    # wait for the subscription before writing
+    while not resp_server.subscribers.get(b"cache-invalidation"):
+        await asyncio.sleep(0.01)
+    await workers[1].invalidate("drones")
+    for _ in range(100):
+        if not len(local):
+            break
+        await asyncio.sleep(0.01)
+
+    assert len(local) == 0
+    assert await workers[0].get_or_load("drones", "available", lambda: load([3])) == [3]
+    assert await workers[1].get_or_load("drones", "available", lambda: load([4])) == [3]
+    for worker in workers:
+        await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_backend_down() -> None:
+    cache = SharedCache(RedisBackend("redis://127.0.0.1:1/0"), ttl=60)
+
+    async def load():
+        return "from the database"
+
+    assert await cache.get_or_load("drones", "available", load) == "from the database"
+    await cache.invalidate("drones")
+    await cache.close()
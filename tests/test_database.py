@@ -0,0 +1,57 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import exc, text
+from src.config.base_config import BaseConfig
+from src.config.database import async_engine, create_engine, engine_options
+from src.config.pool import MeteredPool, pool_metrics
+from tests.utils.seed_db import seed_db
+
+
+def test_engine_options() -> None:
+    settings = BaseConfig(db_statement_timeout=2.5)
+
+    assert engine_options("sqlite+aiosqlite://", settings) == {}
+    options = engine_options("sqlite+aiosqlite:///./drone.db", settings)
+    assert options["poolclass"] is MeteredPool
+    assert "pool_pre_ping" not in options
+
+    options = engine_options("postgresql+asyncpg://drone@db/drone", settings)
+    assert options["pool_pre_ping"] is True
+    assert options["pool_size"] == settings.db_pool_size
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "2500"}}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pragmas() -> None:
+    if async_engine.dialect.name != "sqlite":
+        pytest.skip("SQLite only")
+    async with async_engine.connect() as conn:
+        assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+
+
+@pytest.mark.asyncio
+async def test_request_shares_one_session(client: AsyncClient) -> None:
+    await seed_db()
+    checkouts = pool_metrics.checkouts
+    # the ETag and the drone are read by two dependencies
+    resp = await client.get("/drones/1")
+    assert resp.status_code == 200
+    assert pool_metrics.checkouts - checkouts == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_timeout_is_counted(tmp_path) -> None:
+    settings = BaseConfig(db_pool_size=1, db_max_overflow=0, db_pool_timeout=0.05)
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/pool.db", settings)
+    timeouts = pool_metrics.timeouts
+
+    async with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+    await engine.dispose()
+
+    assert pool_metrics.timeouts - timeouts == 1
+    assert pool_metrics.max_wait_seconds >= 0.05
+    assert pool_metrics.waiting == 0
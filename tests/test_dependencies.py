@@ -16,7 +16,8 @@ from src.services import (
     load_drone,
 )
 from sqlalchemy.ext.asyncio import AsyncSession
-from tests.utils.utils import generate_random_alphanum
+from src.config.database import async_engine
+from tests.utils.utils import QueryCounter, generate_random_alphanum
 from tests.utils.seed_db import seed_db
 
 
@@ -98,3 +99,27 @@ async def test_drone_is_avaliable(session: AsyncSession) -> None:
 
     assert e._excinfo[1].__dict__["status_code"] == 405
     assert "The drone's state must be IDLE and it's" in e._excinfo[1].__dict__["detail"]
+
+
+@pytest.mark.asyncio
+async def test_drone_can_carry_load_single_query(session: AsyncSession) -> None:
+    await seed_db()
+    drone = DroneCreate(
+        serial_number=generate_random_alphanum(10),
+        model=Models.LIGHTWEIGHT,
+        weight_limit=100,
+        battery_capacity=100,
+        state=Status.IDLE,
+    )
+    drone_db = await create_drone(session, drone)
+    medications = sorted(await get_medications(session), key=lambda x: x.id)
+    session.expunge_all()
+    # unknown ids are skipped, ids that overflow the limit are dropped in order
+    medication_ids = [m.id for m in medications] + [999]
+
+    with QueryCounter(async_engine) as counter:
+        can_be_carry = await drone_can_carry_load(drone_db, medication_ids, session)
+
+    assert counter.count == 1
+    assert [m["weight"] for m in can_be_carry["medications"]] == [50, 20, 30]
+    assert can_be_carry["weight_loaded"] == 100
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.cache_backends import MemoryBackend
+from src.events import DroneEventHub, drone_events, server_sent_events
+from src.main import app
+from src.models.drone import Models, Status
+from src.schemas.drone import DroneCreate
+from src.services import create_drone, update_drone
+from tests.utils.utils import generate_random_alphanum
+
+
+@pytest.mark.asyncio
+async def test_hub_coalesces_per_drone() -> None:
+    hub = DroneEventHub()
+    with hub.subscribe() as everything, hub.subscribe([2]) as filtered:
+        assert len(hub) == 2
+        await hub.publish({1: {"state": Status.LOADED}, 2: {"battery_capacity": 90}})
+        await hub.publish({2: {"battery_capacity": 80}})
+        await hub.publish({2: {"state": "IDLE", "serial_number": "ignored"}})
+
+        assert await everything.next_batch() == [
+            {"id": 1, "state": "LOADED"},
+            {"id": 2, "battery_capacity": 80, "state": "IDLE"},
+        ]
+        assert await filtered.next_batch() == [
+            {"id": 2, "battery_capacity": 80, "state": "IDLE"}
+        ]
+        assert filtered.coalesced == 2
+    assert len(hub) == 0
+
+
+@pytest.mark.asyncio
+async def test_hub_relays_between_workers() -> None:
+    backend = MemoryBackend()
+    workers = [DroneEventHub(backend) for _ in range(2)]
+    for worker in workers:
+        await worker.start()
+    await asyncio.sleep(0)
+
+    with workers[0].subscribe() as subscription:
+        await workers[1].publish({1: {"battery_capacity": 50}})
+        batch = await asyncio.wait_for(subscription.next_batch(), timeout=1)
+    assert batch == [{"id": 1, "battery_capacity": 50}]
+    for worker in workers:
+        await worker.close()
+
+
+@pytest.mark.asyncio
+async def test_server_sent_events() -> None:
+    hub = DroneEventHub()
+    with hub.subscribe() as subscription:
+        events = server_sent_events(subscription, keepalive=0.01)
+        assert await events.__anext__() == ": keepalive\n\n"
+        await hub.publish({1: {"state": "IDLE"}, 2: {"state": "LOADED"}})
+        assert await events.__anext__() == (
+            'event: drone\ndata: {"id": 1, "state": "IDLE"}\n\n'
+            'event: drone\ndata: {"id": 2, "state": "LOADED"}\n\n'
+        )
+        await events.aclose()
+
+
+@pytest.mark.asyncio
+async def test_update_drone_publishes(session: AsyncSession) -> None:
+    drone = DroneCreate(
+        serial_number=generate_random_alphanum(10),
+        model=Models.LIGHTWEIGHT,
+        state=Status.IDLE,
+    )
+    db_drone = await create_drone(session, drone)
+    with drone_events.subscribe([db_drone.id]) as subscription:
+        await update_drone(session, db_drone.id, state=Status.LOADING)
+        assert await subscription.next_batch() == [
+            {"id": db_drone.id, "state": "LOADING"}
+        ]
+
+
+def test_drone_events_socket() -> None:
+    client = TestClient(app)
+    with client.websocket_connect("/drones/events/ws?drone_id=1001") as websocket:
+        while not len(drone_events):
+            websocket.portal.call(asyncio.sleep, 0.01)
+        websocket.portal.call(
+            drone_events.publish,
+            {1001: {"battery_capacity": 10}, 1002: {"battery_capacity": 20}},
+        )
+        assert websocket.receive_json() == [{"id": 1001, "battery_capacity": 10}]
+    assert len(drone_events) == 0
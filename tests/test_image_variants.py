@@ -0,0 +1,82 @@
+import os
+import shutil
+from uuid import uuid4
+import pytest
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.files import BASEDIR, IMG_DIR
+from src.image_variants import backfill, collect_garbage
+from src.images import (
+    VARIANT_SIZES,
+    ImageVariant,
+    render_variants,
+    variant_filename,
+)
+from src.models.image_blob import ImageBlob
+from src.schemas.medication import MedicationCreate
+from src.services import (
+    acquire_image_blob,
+    create_medication,
+    get_medication_by_id,
+    release_image_blob,
+)
+from tests.utils.utils import generate_random_alphanum, random_upper_string
+
+TEST_IMAGE = os.path.join(BASEDIR, "tests/api/images/Aspirin.jpeg")
+
+
+def test_render_variants(tmp_path) -> None:
+    shutil.copy(TEST_IMAGE, tmp_path / "aspirin.jpeg")
+
+    variants = render_variants(str(tmp_path), "aspirin.jpeg")
+
+    assert set(variants) == {variant.value for variant in ImageVariant}
+    for variant, size in VARIANT_SIZES.items():
+        with Image.open(tmp_path / variants[variant.value]) as image:
+            assert image.format == "WEBP"
+            assert max(image.size) <= size
+
+
+@pytest.mark.asyncio
+async def test_backfill(session: AsyncSession) -> None:
+    filename = f"{uuid4().hex}.jpeg"
+    shutil.copy(TEST_IMAGE, os.path.join(IMG_DIR, filename))
+    medication = MedicationCreate(
+        name=generate_random_alphanum(10), weight=10, code=random_upper_string(10)
+    )
+    db_medication = await create_medication(session, medication, filename)
+    await create_medication(
+        session,
+        MedicationCreate(
+            name=generate_random_alphanum(10), weight=10, code=random_upper_string(9)
+        ),
+    )
+
+    assert await backfill() == 1
+
+    session.expunge_all()
+    db_medication = await get_medication_by_id(session, db_medication.id)
+    thumbnail = db_medication["variants"][ImageVariant.THUMBNAIL.value]
+    assert os.path.isfile(os.path.join(IMG_DIR, thumbnail))
+
+
+@pytest.mark.asyncio
+async def test_collect_garbage(session: AsyncSession) -> None:
+    used, unused = f"{uuid4().hex}.jpeg", f"{uuid4().hex}.jpeg"
+    for filename in (used, unused):
+        shutil.copy(TEST_IMAGE, os.path.join(IMG_DIR, filename))
+    thumbnail = variant_filename(unused, ImageVariant.THUMBNAIL)
+    shutil.copy(TEST_IMAGE, os.path.join(IMG_DIR, thumbnail))
+    await acquire_image_blob(session, uuid4().hex, used, 10)
+    await acquire_image_blob(session, uuid4().hex, unused, 10)
+    await release_image_blob(session, unused)
+    await session.commit()
+
+    assert await collect_garbage() == [unused]
+
+    assert os.path.isfile(os.path.join(IMG_DIR, used))
+    assert not os.path.exists(os.path.join(IMG_DIR, unused))
+    assert not os.path.exists(os.path.join(IMG_DIR, thumbnail))
+    blobs = (await session.scalars(select(ImageBlob.filename))).all()
+    assert blobs == [used]
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.database import async_engine
+from src.services import (
+    get_available_drones,
+    get_drone_loads,
+    get_medication_by_load,
+)
+from tests.utils.seed_db import seed_db
+from tests.utils.utils import QueryCounter, query_plan
+
+
+async def plans(session: AsyncSession, service, *args) -> list[str]:
+    """Plans of the statements a service runs"""
+    with QueryCounter(async_engine) as counter:
+        await service(session, *args)
+    return [
+        await query_plan(session, statement, parameters)
+        for statement, parameters in zip(counter.statements, counter.parameters)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_available_drones_use_index(session: AsyncSession) -> None:
+    await seed_db()
+    [plan] = await plans(session, get_available_drones)
+    assert "drone_state_battery_capacity_idx" in plan
+
+
+@pytest.mark.asyncio
+async def test_drone_loads_use_index(session: AsyncSession) -> None:
+    await seed_db()
+    [plan] = await plans(session, get_drone_loads, 4)
+    assert "load_drone_id_create_idx" in plan
+    # the medications of each load are found by load_medication's primary key
+    assert "load_medication_pkey" in plan or "autoindex_load_medication" in plan
+
+
+@pytest.mark.asyncio
+async def test_medications_by_load_use_primary_key(session: AsyncSession) -> None:
+    await seed_db()
+    [plan] = await plans(session, get_medication_by_load, 1)
+    assert "load_medication_pkey" in plan or "autoindex_load_medication" in plan
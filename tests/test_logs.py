@@ -0,0 +1,104 @@
+import io
+import json
+import logging
+import logging.handlers
+import queue
+from src.config.logs import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    RateLimitFilter,
+    start_log_queue,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_json_formatter() -> None:
+    record = logging.makeLogRecord(
+        {"name": "loading", "levelname": "WARNING", "msg": "%s is heavy"}
+    )
+    record.args = ("Aspirin",)
+    record.drone = "SN1"
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Aspirin is heavy"
+    assert entry["level"] == "WARNING"
+    assert entry["logger"] == "loading"
+    assert entry["drone"] == "SN1"
+
+
+def test_rate_limit_filter() -> None:
+    clock = Clock()
+    rate_limit = RateLimitFilter(rate=2, clock=clock)
+
+    def log(msg: str) -> logging.LogRecord | None:
+        record = logging.makeLogRecord({"msg": msg, "args": ("Aspirin",)})
+        return record if rate_limit.filter(record) else None
+
+    kept = [log("%s can't be loaded") for _ in range(10)]
+    assert len([record for record in kept if record]) == 2
+    # another kind of message has its own budget
+    assert log("No medication %s")
+    assert rate_limit.suppressed == 8
+
+    clock.now = 0.5
+    record = log("%s can't be loaded")
+    assert record.getMessage() == (
+        "Aspirin can't be loaded (8 similar messages suppressed)"
+    )
+    assert log("%s can't be loaded") is None
+
+
+def test_log_queue() -> None:
+    stream = io.StringIO()
+    logger = logging.getLogger("test_log_queue")
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(stream))
+    listener = start_log_queue(logger)
+    try:
+        [handler] = logger.handlers
+        assert isinstance(handler, DroppingQueueHandler)
+        logger.warning("%s medication can't be loaded", "Aspirin")
+    finally:
+        listener.stop()
+        logger.removeHandler(handler)
+    assert stream.getvalue() == "Aspirin medication can't be loaded\n"
+
+    full = DroppingQueueHandler(queue.Queue(1))
+    for _ in range(3):
+        full.handle(logging.makeLogRecord({"msg": "lagging"}))
+    assert full.dropped == 2
+
+
+def test_audit_rotation_is_lossless(tmp_path) -> None:
+    [audit_handler] = logging.getLogger("battery_check").handlers
+    assert audit_handler.queue.maxsize == 0
+
+    path = tmp_path / "battery.log"
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=2000, backupCount=100)
+    logger = logging.getLogger("test_audit_rotation")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    listener = start_log_queue(logger, maxsize=0)
+    [queue_handler] = logger.handlers
+    try:
+        for batch in range(20):
+            for i in range(10):
+                logger.info("Drone %s-%s, battery capacity: 50 %%", batch, i)
+        listener.stop()
+    finally:
+        logger.removeHandler(queue_handler)
+        handler.close()
+
+    files = sorted(tmp_path.iterdir())
+    assert len(files) > 1
+    lines = [line for file in files for line in file.read_text().splitlines()]
+    assert len(lines) == 200
+    assert len(set(lines)) == 200
@@ -0,0 +1,67 @@
+import pytest
+from httpx import AsyncClient
+from src.main import check_battery
+from src.metrics import Histogram
+from tests.utils.seed_db import seed_db
+
+
+def sample(text: str, series: str) -> float:
+    for line in text.splitlines():
+        name, _, value = line.rpartition(" ")
+        if name == series:
+            return float(value)
+    return 0
+
+
+def test_histogram_render() -> None:
+    histogram = Histogram("latency_seconds", "Latency", ("route",), (0.1, 1))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(0.1, "/a", count=2)
+    histogram.observe(3, "/b")
+
+    assert list(histogram.render()) == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 3',
+        'latency_seconds_bucket{route="/a",le="1"} 4',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 0.75',
+        'latency_seconds_count{route="/a"} 4',
+        'latency_seconds_bucket{route="/b",le="0.1"} 0',
+        'latency_seconds_bucket{route="/b",le="1"} 0',
+        'latency_seconds_bucket{route="/b",le="+Inf"} 1',
+        'latency_seconds_sum{route="/b"} 3',
+        'latency_seconds_count{route="/b"} 1',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: AsyncClient) -> None:
+    await seed_db()
+    route = 'method="GET",route="/drones/{drone_id}"'
+    before = (await client.get("/metrics")).text
+
+    for drone_id in (1, 2, 999):
+        await client.get(f"/drones/{drone_id}")
+    await client.get("/no/such/path")
+    await check_battery()
+    resp = await client.get("/metrics")
+    after = resp.text
+
+    def delta(series: str) -> float:
+        return sample(after, series) - sample(before, series)
+
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    count = "http_request_duration_seconds_count"
+    assert delta(f'{count}{{{route},status="200"}}') == 2
+    assert delta(f'{count}{{{route},status="404"}}') == 1
+    assert delta(f'{count}{{method="GET",route="unmatched",status="404"}}') == 1
+    # the ETag versions and the drone, three requests
+    assert delta(f"http_request_queries_sum{{{route}}}") == 6
+    assert delta('scheduler_job_duration_seconds_count{job="check_battery"}') == 1
+
+    assert sample(after, 'drones{state="IDLE"}') == 3
+    assert sample(after, 'drones{state="LOADED"}') == 2
+    assert sample(after, 'drones{state="DELIVERING"}') == 0
+    assert sample(after, "drone_battery_capacity_percent_count") == 5
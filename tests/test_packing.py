@@ -0,0 +1,71 @@
+import random
+from itertools import combinations
+
+from src.packing import PackingStrategy, first_fit_decreasing, pack, utilisation
+
+
+def best_subset_weight(weights: list[int], capacity: int) -> int:
+    return max(
+        sum(subset)
+        for size in range(len(weights) + 1)
+        for subset in combinations(weights, size)
+        if sum(subset) <= capacity
+    )
+
+
+def test_first_fit_keeps_request_order() -> None:
+    assert pack(PackingStrategy.FIRST_FIT, [50, 20, 30, 100, 15], 100) == [0, 1, 2]
+
+
+def test_knapsack_fills_capacity_first_fit_misses() -> None:
+    weights = [60, 50, 50]
+    assert pack(PackingStrategy.FIRST_FIT, weights, 100) == [0]
+    assert pack(PackingStrategy.KNAPSACK, weights, 100) == [1, 2]
+
+
+def test_knapsack_is_optimal() -> None:
+    rng = random.Random(7)
+    for _ in range(50):
+        weights = [rng.randint(1, 200) for _ in range(10)]
+        capacity = rng.randint(1, 500)
+        chosen = pack(PackingStrategy.KNAPSACK, weights, capacity)
+        assert len(set(chosen)) == len(chosen)
+        assert sum(weights[i] for i in chosen) == best_subset_weight(weights, capacity)
+
+
+def test_priority_prefers_valuable_items() -> None:
+    weights = [90, 40, 40]
+    values = [5, 1, 1]
+    assert pack(PackingStrategy.PRIORITY, weights, 100, values) == [0]
+    # with equal priorities the number of items wins
+    assert pack(PackingStrategy.PRIORITY, weights, 100) == [1, 2]
+
+
+def test_density_orders_by_value_per_weight() -> None:
+    weights = [80, 10, 30]
+    values = [8, 5, 6]
+    assert pack(PackingStrategy.DENSITY, weights, 50, values) == [1, 2]
+
+
+def test_items_heavier_than_capacity_are_skipped() -> None:
+    for strategy in PackingStrategy:
+        assert pack(strategy, [600, 700], 500) == []
+
+
+def test_first_fit_decreasing_spreads_items_across_bins() -> None:
+    weights = [20, 90, 50, 40, 700]
+    bins = first_fit_decreasing(weights, [100, 100])
+    assert bins == [[1], [2, 3]]
+    assigned = {i for items in bins for i in items}
+    # 20 no longer fits anywhere and 700 is heavier than every bin
+    assert assigned == {1, 2, 3}
+
+
+def test_first_fit_decreasing_never_repeats_a_key_in_a_bin() -> None:
+    bins = first_fit_decreasing([10, 10, 10], [100, 100], keys=[7, 7, 8])
+    assert bins == [[0, 2], [1]]
+
+
+def test_utilisation() -> None:
+    assert utilisation(250, 500) == 0.5
+    assert utilisation(0, 0) == 0.0
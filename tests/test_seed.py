@@ -0,0 +1,162 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import src.main
+from src.config.base_config import base_settings
+from src.models.drone import Drone, Models, Status
+from src.models.load import Load, load_medication
+from src.models.medication import Medication
+from src.schemas.seed import SeedSpec
+from src.seed import seed_database, seeding
+
+
+async def snapshot(session: AsyncSession) -> tuple[list, list, list, list]:
+    drones = select(
+        Drone.serial_number,
+        Drone.model,
+        Drone.weight_limit,
+        Drone.battery_capacity,
+        Drone.state,
+    ).order_by(Drone.id)
+    medications = select(Medication.code, Medication.weight).order_by(Medication.id)
+    loads = select(Load.drone_id, Load.create, Load.weight_loaded).order_by(Load.id)
+    links = select(load_medication).order_by(
+        load_medication.c.load_id, load_medication.c.medication_id
+    )
+    return tuple(
+        [
+            (await session.execute(query)).all()
+            for query in (drones, medications, loads, links)
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_seed_is_deterministic(session: AsyncSession) -> None:
+    spec = SeedSpec(drones=50, medications=20, loads=100, seed=7)
+
+    counts = await seed_database(spec, chunk_size=16)
+    first = await snapshot(session)
+    await seed_database(spec)
+    second = await snapshot(session)
+    await seed_database(SeedSpec(drones=50, medications=20, loads=100, seed=8))
+    other = await snapshot(session)
+
+    assert counts == {"drone": 50, "medication": 20, "load": 100}
+    assert first == second
+    assert first != other
+
+
+@pytest.mark.asyncio
+async def test_seed_distributions(session: AsyncSession) -> None:
+    spec = SeedSpec(
+        drones=200,
+        medications=30,
+        loads=300,
+        states={Status.IDLE: 3, Status.DELIVERING: 1},
+        models={Models.LIGHTWEIGHT: 1},
+        battery_capacity=(40, 60),
+        weight_limit=(100, 140),
+        medication_weight=(50, 100),
+        load_sizes={3: 1},
+    )
+
+    await seed_database(spec, chunk_size=64)
+
+    states = dict(
+        (await session.execute(select(Drone.state, func.count()).group_by(Drone.state)))
+        .tuples()
+        .all()
+    )
+    assert set(states) == {Status.IDLE, Status.DELIVERING}
+    assert states[Status.IDLE] > states[Status.DELIVERING]
+    # only the scheduled states are due to move on
+    due = select(func.count()).where(Drone.state_due_at.is_not(None))
+    assert await session.scalar(due) == states[Status.DELIVERING]
+    drones = (await session.execute(select(Drone))).scalars().all()
+    assert {drone.model for drone in drones} == {Models.LIGHTWEIGHT}
+    assert all(40 <= drone.battery_capacity <= 60 for drone in drones)
+
+    limits = {drone.id: drone.weight_limit for drone in drones}
+    weights = dict(
+        (await session.execute(select(Medication.id, Medication.weight))).all()
+    )
+    loaded: dict[int, int] = {}
+    sizes: dict[int, int] = {}
+    for load_id, medication_id in await session.execute(select(load_medication)):
+        loaded[load_id] = loaded.get(load_id, 0) + weights[medication_id]
+        sizes[load_id] = sizes.get(load_id, 0) + 1
+    loads = (await session.execute(select(Load))).scalars().all()
+    assert len(loads) == len(sizes) == 300
+    for load in loads:
+        assert load.weight_loaded == loaded[load.id]
+        # three medications of 50-100 never fit in 140
+        assert 1 <= sizes[load.id] <= 2
+        assert sizes[load.id] == 1 or load.weight_loaded <= limits[load.drone_id]
+
+
+def test_seed_spec_validation() -> None:
+    with pytest.raises(ValidationError):
+        SeedSpec(battery_capacity=(50, 120))
+    with pytest.raises(ValidationError):
+        SeedSpec(states={Status.IDLE: 0})
+    with pytest.raises(ValidationError):
+        SeedSpec(load_sizes={0: 1})
+    with pytest.raises(ValidationError):
+        SeedSpec(drones=10, loads=10)
+
+
+@pytest.mark.asyncio
+async def test_seed_endpoint(client: AsyncClient, monkeypatch) -> None:
+    body = {"drones": 10, "medications": 5, "loads": 20, "seed": 1}
+    resp = await client.post("/admin/seed/", json=body)
+    assert resp.status_code == 404
+
+    monkeypatch.setattr(base_settings, "admin_token", "secret")
+    resp = await client.post("/admin/seed/", json=body)
+    assert resp.status_code == 403
+    resp = await client.post(
+        "/admin/seed/", json=body, headers={"X-Admin-Token": "wrong"}
+    )
+    assert resp.status_code == 403
+    resp = await client.post(
+        "/admin/seed/",
+        json={**body, "weight_limit": [0, 100]},
+        headers={"X-Admin-Token": "secret"},
+    )
+    assert resp.status_code == 422
+
+    resp = await client.post(
+        "/admin/seed/", json=body, headers={"X-Admin-Token": "secret"}
+    )
+    assert resp.status_code == 202
+    # the background task ran before the response was handed over
+    resp = await client.get("/drones/", params={"limit": 100})
+    assert len(resp.json()) == 10
+
+
+@pytest.mark.asyncio
+async def test_seed_endpoint_one_at_a_time(client: AsyncClient, monkeypatch) -> None:
+    monkeypatch.setattr(base_settings, "admin_token", "secret")
+    body = {"drones": 10, "medications": 5, "loads": 20, "seed": 1}
+    seed_in_background = src.main.seed_in_background
+
+    async def sent_later(spec: SeedSpec) -> None:
+        # the response is sent before the task runs, the other request with it
+        await asyncio.sleep(0)
+        await seed_in_background(spec)
+
+    monkeypatch.setattr(src.main, "seed_in_background", sent_later)
+
+    responses = await asyncio.gather(
+        *(
+            client.post("/admin/seed/", json=body, headers={"X-Admin-Token": "secret"})
+            for _ in range(2)
+        )
+    )
+
+    assert sorted(resp.status_code for resp in responses) == [202, 409]
+    assert not seeding.locked()
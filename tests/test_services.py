@@ -0,0 +1,164 @@
+import io
+import logging
+import pytest
+from datetime import timedelta
+from src.battery import DEFAULT_BATTERY_MODEL, BatteryModel, BatterySimulation
+from src.clock import SimulatedClock
+from src.models.drone import Models, Status
+from src.schemas.drone import DroneCreate
+from src.models.load import Load
+from src.services import (
+    create_drone,
+    get_drones,
+    get_table_versions,
+    update_and_check_battery,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config.database import async_engine
+from src.config.logs import flush_logs
+from tests.utils.utils import generate_random_alphanum
+
+
+@pytest.mark.asyncio
+async def test_update_and_check_battery(session: AsyncSession) -> None:
+    # 1% per tick whatever the state, like a plain countdown
+    flat_drain = BatterySimulation(
+        BatteryModel(drain={state: 1.0 for state in Status}), interval=1
+    )
+    batteries = [100, 50, 0, 1, 30]
+    serial_numbers = []
+    for i, battery_capacity in enumerate(batteries):
+        drone = DroneCreate(
+            serial_number=generate_random_alphanum(10 + i),
+            model=Models.LIGHTWEIGHT,
+            battery_capacity=battery_capacity,
+            state=Status.IDLE,
+        )
+        serial_numbers.append((await create_drone(session, drone)).serial_number)
+
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    audit_logger = logging.getLogger("battery_check")
+    audit_logger.addHandler(handler)
+    try:
+        await update_and_check_battery(batch_size=2, simulation=flat_drain)
+        flush_logs()
+    finally:
+        audit_logger.removeHandler(handler)
+
+    session.expunge_all()
+    drones = await get_drones(session)
+    assert [drone.battery_capacity for drone in drones] == [99, 49, 0, 0, 29]
+    # one write per created drone and per batch with changes
+    assert await get_table_versions(session, ["drone"]) == {"drone": 8}
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 4
+    assert f"Drone {serial_numbers[3]}, battery capacity: 0 %" in lines
+    assert not any(serial_numbers[2] in line for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_battery_simulation_by_state(session: AsyncSession) -> None:
+    drones = [
+        (Models.MIDDLEWEIGHT, Status.IDLE, 50),
+        (Models.MIDDLEWEIGHT, Status.DELIVERING, 50),
+        (Models.HEAVYWEIGHT, Status.DELIVERING, 50),
+        (Models.MIDDLEWEIGHT, Status.DELIVERING, 50),
+        (Models.MIDDLEWEIGHT, Status.IDLE, 99),
+    ]
+    for i, (model, state, battery_capacity) in enumerate(drones):
+        drone = DroneCreate(
+            serial_number=generate_random_alphanum(10 + i),
+            model=model,
+            battery_capacity=battery_capacity,
+            state=state,
+        )
+        await create_drone(session, drone)
+    # the fourth drone carries 500 grams
+    session.add(Load(drone_id=4, weight_loaded=500))
+    await session.commit()
+
+    clock = SimulatedClock()
+    simulation = BatterySimulation(DEFAULT_BATTERY_MODEL, clock, interval=10)
+    await update_and_check_battery(simulation=simulation)
+    clock.advance(timedelta(minutes=5))
+    await update_and_check_battery(simulation=simulation)
+    flush_logs()
+
+    session.expunge_all()
+    batteries = [drone.battery_capacity for drone in await get_drones(session)]
+    # 15 simulated minutes: idle recharges 1%, delivering drains 1% scaled by
+    # the model, 500 grams add 1% and the capacity is capped at 100, the
+    # heavyweight drained 22.5% and carries the half percent
+    assert batteries == [65, 35, 28, 20, 100]
+
+
+@pytest.mark.asyncio
+async def test_battery_drains_below_one_percent_per_tick(
+    session: AsyncSession,
+) -> None:
+    for i, state in enumerate((Status.DELIVERING, Status.IDLE)):
+        drone = DroneCreate(
+            serial_number=generate_random_alphanum(10 + i),
+            model=Models.LIGHTWEIGHT,
+            battery_capacity=50,
+            state=state,
+        )
+        await create_drone(session, drone)
+
+    clock = SimulatedClock()
+    model = BatteryModel(drain={Status.DELIVERING: 0.1}, recharge={Status.IDLE: 0.15})
+    simulation = BatterySimulation(model, clock, interval=3)
+    updates = []
+
+    def on_execute(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE drone"):
+            updates.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        for _ in range(10):
+            await update_and_check_battery(simulation=simulation)
+            clock.advance(timedelta(minutes=3))
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    flush_logs()
+    # the capacity and the fraction carried are written by the same statement
+    assert len(updates) == 10
+
+    session.expunge_all()
+    drones = await get_drones(session)
+    # 0.3% and 0.45% a tick, rounded every tick they would never move
+    assert [drone.battery_capacity for drone in drones] == [47, 54]
+    assert drones[1].battery_remainder == pytest.approx(-0.5)
+
+
+@pytest.mark.asyncio
+async def test_table_version_bumped_after_commit(session: AsyncSession) -> None:
+    engine = async_engine.sync_engine
+    statements = []
+
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(" ".join(statement.split()[:2]))
+
+    def on_commit(conn):
+        statements.append("COMMIT")
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    event.listen(engine, "commit", on_commit)
+    try:
+        drone = DroneCreate(
+            serial_number=generate_random_alphanum(10),
+            model=Models.LIGHTWEIGHT,
+            state=Status.IDLE,
+        )
+        await create_drone(session, drone)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+        event.remove(engine, "commit", on_commit)
+
+    # the counter isn't locked for the length of the write
+    assert statements == ["INSERT INTO", "COMMIT", "UPDATE table_version", "COMMIT"]
+    assert await get_table_versions(session, ["drone"]) == {"drone": 1}
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.clock import SimulatedClock
+from src.models.drone import Drone, Models, Status
+from src.bulk_import import DRONE_IMPORT, bulk_import
+from src.schemas.drone import DroneCreate
+from src.services import advance_drone_states, create_drone, get_drones
+from src.state_machine import (
+    SCHEDULE,
+    InvalidTransition,
+    StateMachine,
+    check_transition,
+)
+
+
+def test_check_transition() -> None:
+    check_transition(Status.IDLE, Status.LOADING)
+    check_transition(Status.RETURNING, Status.IDLE)
+    with pytest.raises(InvalidTransition):
+        check_transition(Status.IDLE, Status.DELIVERING)
+    with pytest.raises(InvalidTransition):
+        check_transition(Status.DELIVERED, Status.LOADED)
+
+
+@pytest.mark.asyncio
+async def test_advance_drone_states(session: AsyncSession) -> None:
+    clock = SimulatedClock()
+    machine = StateMachine({state: timedelta(minutes=10) for state in SCHEDULE}, clock)
+    now = clock.now()
+    drones = [
+        (Status.LOADED, now),
+        (Status.DELIVERING, now - timedelta(minutes=1)),
+        (Status.DELIVERED, now + timedelta(minutes=5)),
+        (Status.RETURNING, now),
+        (Status.IDLE, None),
+    ]
+    await session.execute(
+        insert(Drone).values(
+            [
+                {
+                    "serial_number": f"SM{i}",
+                    "model": Models.LIGHTWEIGHT,
+                    "weight_limit": 500,
+                    "battery_capacity": 100,
+                    "state": state,
+                    "state_due_at": due_at,
+                }
+                for i, (state, due_at) in enumerate(drones)
+            ]
+        )
+    )
+    await session.commit()
+
+    moved = await advance_drone_states(machine)
+    assert sorted(row.id for row in moved) == [1, 2, 4]
+
+    session.expunge_all()
+    drones = await get_drones(session)
+    assert [drone.state for drone in drones] == [
+        Status.DELIVERING,
+        Status.DELIVERED,
+        Status.DELIVERED,
+        Status.IDLE,
+        Status.IDLE,
+    ]
+    assert drones[0].state_due_at == now + timedelta(minutes=10)
+    assert drones[3].state_due_at is None
+
+    # nothing else is due until the clock moves
+    assert await advance_drone_states(machine) == []
+    clock.advance(timedelta(minutes=10))
+    moved = await advance_drone_states(machine)
+    assert sorted(row.id for row in moved) == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_created_drones_are_scheduled(session: AsyncSession) -> None:
+    drone = DroneCreate(
+        serial_number="SM_CREATED", model=Models.LIGHTWEIGHT, state=Status.LOADED
+    )
+    await create_drone(session, drone)
+    rows = [
+        {"serial_number": "SM_IMPORTED", "model": "LIGHTWEIGHT", "state": state}
+        for state in ("DELIVERING", "IDLE")
+    ]
+    rows[1]["serial_number"] += "_IDLE"
+    await bulk_import(session, DRONE_IMPORT, rows)
+
+    clock = SimulatedClock(datetime.utcnow() + timedelta(days=1))
+    machine = StateMachine({state: timedelta(minutes=10) for state in SCHEDULE}, clock)
+    moved = await advance_drone_states(machine)
+    assert sorted(row.id for row in moved) == [1, 2]
+
+    session.expunge_all()
+    drones = await get_drones(session)
+    assert [drone.state for drone in drones] == [
+        Status.DELIVERING,
+        Status.DELIVERED,
+        Status.IDLE,
+    ]
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+
+class RespServer:
+    """
+    Stand-in for a Redis server, speaks enough of the protocol for the cache
+    backend: GET, SET with EX, INCR(BY), PUBLISH, SUBSCRIBE and PING
+    """
+
+    def __init__(self):
+        self.values: dict[bytes, tuple[float | None, bytes]] = {}
+        self.subscribers: dict[bytes, set[asyncio.StreamWriter]] = {}
+        self.connections: set[asyncio.Task] = set()
+        self.server: asyncio.AbstractServer | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    async def start(self) -> "RespServer":
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def close(self) -> None:
+        self.server.close()
+        for connection in self.connections:
+            connection.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer) -> None:
+        connection = asyncio.current_task()
+        self.connections.add(connection)
+        try:
+            while command := await self._read_command(reader):
+                name, *args = command
+                writer.write(self._execute(name.upper(), args, writer))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for writers in self.subscribers.values():
+                writers.discard(writer)
+            self.connections.discard(connection)
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader) -> list[bytes] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        command = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            command.append((await reader.readexactly(length + 2))[:-2])
+        return command
+
+    def _execute(self, name: bytes, args: list[bytes], writer) -> bytes:
+        match name:
+            case b"PING":
+                return b"+PONG\r\n"
+            case b"GET":
+                return bulk(self._get(args[0]))
+            case b"SET":
+                expires_at = None
+                if len(args) > 3 and args[2].upper() == b"EX":
+                    expires_at = time.monotonic() + int(args[3])
+                self.values[args[0]] = (expires_at, args[1])
+                return b"+OK\r\n"
+            case b"INCR" | b"INCRBY":
+                amount = int(args[1]) if len(args) > 1 else 1
+                value = int(self._get(args[0]) or 0) + amount
+                self.values[args[0]] = (None, str(value).encode())
+                return integer(value)
+            case b"PUBLISH":
+                writers = self.subscribers.get(args[0], set())
+                for subscriber in writers:
+                    subscriber.write(array([b"message", args[0], args[1]]))
+                return integer(len(writers))
+            case b"SUBSCRIBE":
+                replies = []
+                for count, channel in enumerate(args, start=1):
+                    self.subscribers.setdefault(channel, set()).add(writer)
+                    replies.append(array([b"subscribe", channel, count]))
+                return b"".join(replies)
+            case b"UNSUBSCRIBE":
+                for writers in self.subscribers.values():
+                    writers.discard(writer)
+                return array([b"unsubscribe", None, 0])
+        return b"-ERR unknown command\r\n"
+
+    def _get(self, key: bytes) -> bytes | None:
+        expires_at, value = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.values[key]
+            return None
+        return value
+
+
+def bulk(value: bytes | None) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+def array(items: list) -> bytes:
+    encoded = [integer(i) if isinstance(i, int) else bulk(i) for i in items]
+    return b"*%d\r\n" % len(items) + b"".join(encoded)
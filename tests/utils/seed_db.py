@@ -1,9 +1,7 @@
-from sqlalchemy import insert
-from src.models.medication import Medication
-from src.config.database import get_async_session
-from src.models.drone import Status, Models, Drone
+from src.models.drone import Status, Models
+from src.schemas.seed import SeedSpec
+from src.seed import seed_database
 from .utils import generate_random_alphanum, random_upper_string, random_number
-from src.config.database import custom_metadata, async_engine
 
 
 drones = [
@@ -73,11 +71,20 @@ medications = [
 ]
 
 
-async def seed_db():
-    async for session in get_async_session():
-        async with async_engine.begin() as conn:
-            await conn.run_sync(custom_metadata.drop_all)
-            await conn.run_sync(custom_metadata.create_all)
-        await session.execute(insert(Drone).values(drones))
-        await session.execute(insert(Medication).values(medications))
-        await session.commit()
+async def seed_db(
+    drone_count: int = 0, medication_count: int = 0, load_count: int = 0, seed: int = 0
+):
+    """
+    Recreate the tables with the fixture drones and medications, and as many
+    generated drones, medications and loads as asked on top of them
+    - the generated drones are IDLE with enough battery to be loaded
+    """
+    spec = SeedSpec(
+        drones=drone_count,
+        medications=medication_count,
+        loads=load_count,
+        seed=seed,
+        states={Status.IDLE: 1},
+        battery_capacity=(25, 100),
+    )
+    await seed_database(spec, drones, medications)
@@ -1,5 +1,7 @@
 import random
 import string
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 ALPHA_NUM = string.ascii_letters + string.digits
 
@@ -20,3 +22,42 @@ def random_number(start: int = 100, end: int | None = None):
             return random.randrange(start=start, stop=end + 1)
     else:
         return random.randrange(start=1, stop=start)
+
+
+class QueryCounter:
+    """Count the statements an engine sends to the database while active."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine.sync_engine
+        self.statements: list[str] = []
+        self.parameters: list = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, *args):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+async def query_plan(session: AsyncSession, statement: str, parameters) -> str:
+    """
+    Plan chosen by the database for a statement, as text
+    - sequential scans are disabled on PostgreSQL, on a few test rows they
+    would win over any index
+    """
+    conn = await session.connection()
+    if conn.dialect.name == "postgresql":
+        await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in rows)
+    rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return "\n".join(row[-1] for row in rows)